@@ -0,0 +1,72 @@
+"""
+Fill dtr_days.*_min (minutes after midnight) from the VARCHAR time columns.
+
+Migration 0002 runs this once for the rows that exist when it is applied; new
+uploads get the minutes at ingest time. Run it by hand after loading an old dump
+(e.g. updatedd/DB/Dump20250525) into a database that is already migrated:
+
+    python backfill_dtr_minutes.py [--batch-size 5000]
+"""
+import argparse
+
+from db_pool import pool
+from db_utils import update_by_key
+from dtr_time import MINUTE_COLUMNS, TIME_FIELDS, parse_time
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Rows with a time string but no parsed value; unparseable strings stay NULL
+MISSING_MINUTES = " OR ".join(
+    f"({column} IS NULL AND {field} <> '')" for field, column in zip(TIME_FIELDS, MINUTE_COLUMNS)
+)
+
+
+def backfill(cursor, batch_size=BACKFILL_BATCH_SIZE, on_batch=None):
+    """Walks dtr_days by id. Does not commit unless on_batch does. Returns the rows updated."""
+    last_id, updated = 0, 0
+    while True:
+        cursor.execute(f"""
+            SELECT id, {', '.join(TIME_FIELDS)} FROM dtr_days
+            WHERE id > %s AND ({MISSING_MINUTES})
+            ORDER BY id LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return updated
+
+        for i, column in enumerate(MINUTE_COLUMNS, start=1):
+            values = {row[0]: parse_time(row[i]) for row in rows}
+            values = {row_id: minutes for row_id, minutes in values.items() if minutes is not None}
+            if values:
+                update_by_key(cursor, "dtr_days", "id", column, values)
+
+        last_id = rows[-1][0]
+        updated += len(rows)
+        if on_batch:
+            on_batch(updated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                def commit_batch(updated):
+                    connection.commit()
+                    print(f"  {updated} rows")
+
+                updated = backfill(cursor, args.batch_size, commit_batch)
+                connection.commit()
+            finally:
+                cursor.close()
+    finally:
+        pool.close_all()
+    print(f"Backfilled minutes for {updated} dtr_days rows")
+
+
+if __name__ == "__main__":
+    main()
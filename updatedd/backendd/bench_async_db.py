@@ -0,0 +1,102 @@
+"""
+Single event loop throughput: blocking mysql.connector calls vs the async facade.
+
+Runs N concurrent "requests" on one loop, each issuing a query that takes
+--query-time seconds on the server (SELECT SLEEP(x)), the way one uvicorn
+worker would see them.
+
+    python bench_async_db.py --requests 50 --concurrency 10 --query-time 0.05
+
+A last round runs get_async_db at --overload times the pool's capacity, so most
+requests wait for a connection while others need a db thread for their queries.
+It must finish without a 503.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from fastapi import HTTPException
+
+from db_pool import pool
+from db_async import AsyncConnection, get_async_db, run_in_db_thread
+
+
+async def blocking_request(query_time):
+    # What the handlers used to do: call the driver straight from the coroutine
+    connection = pool.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT SLEEP(%s)", (query_time,))
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        pool.release(connection)
+
+
+async def async_request(query_time):
+    connection = await run_in_db_thread(pool.acquire)
+    try:
+        cursor = AsyncConnection(connection).cursor()
+        await cursor.execute("SELECT SLEEP(%s)", (query_time,))
+        await cursor.fetchall()
+        await cursor.close()
+    finally:
+        await run_in_db_thread(pool.release, connection)
+
+
+async def dependency_request(query_time):
+    # The way FastAPI drives the dependency: several queries per checked out connection
+    dependency = get_async_db()
+    connection = await dependency.__anext__()
+    try:
+        for _ in range(3):
+            cursor = connection.cursor()
+            await cursor.execute("SELECT SLEEP(%s)", (query_time,))
+            await cursor.fetchall()
+            await cursor.close()
+    finally:
+        await dependency.aclose()
+
+
+async def run(request_fn, total, concurrency, query_time):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await request_fn(query_time)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--query-time", type=float, default=0.05)
+    parser.add_argument("--overload", type=int, default=4, help="Concurrency of the last round, times pool capacity")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+    print(pool.metrics())
+
+
+async def bench(args):
+    # One loop for every round: get_async_db's slots belong to the loop that first waits on them
+    for label, fn in (("blocking", blocking_request), ("async facade", async_request)):
+        elapsed = await run(fn, args.requests, args.concurrency, args.query_time)
+        print(f"{label:>13}: {args.requests} requests in {elapsed:.2f}s -> {args.requests / elapsed:.1f} req/s")
+
+    concurrency = (pool.size + pool.max_overflow) * args.overload
+    total = max(args.requests, concurrency * 2)
+    try:
+        elapsed = await run(dependency_request, total, concurrency, args.query_time)
+    except HTTPException as e:
+        sys.exit(f"     overload: {e.detail}")
+    print(f"     overload: {total} requests at concurrency {concurrency} in {elapsed:.2f}s "
+          f"-> {total / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Micro-benchmark for dtr_parser against the parsing code that used to live in /ocr.
+
+Builds a corpus of synthetic DTR OCR texts (one to three forms per upload, with
+the usual OCR quirks: 'u' for 11, AM/PM suffixes, undertime columns), checks that
+both parsers agree, then times them.
+
+    python bench_dtr_parser.py --documents 500 --repeat 5
+"""
+import argparse
+import random
+import re
+import time
+
+import dtr_parser
+
+NAMES = ["JUANA M. SANTOS", "PEDRO L. REYES", "MARIA C. DELA PAZ", "JOSE P. RIZAL", "ANA B. GARCIA"]
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+
+
+def fake_time(hour, jitter, rng, suffix):
+    minute = rng.randint(0, jitter)
+    text = f"{hour}:{minute:02d}"
+    if suffix:
+        text += rng.choice([" AM", "AM", " am"]) if hour < 12 else rng.choice([" PM", "PM"])
+    return text
+
+
+def fake_form(rng):
+    name = rng.choice(NAMES)
+    month = rng.choice(MONTHS)
+    year = rng.choice([2024, 2025])
+    suffix = rng.random() < 0.3
+    lines = [
+        "DAILY TIME RECORD",
+        "CSC Form No. 48",
+        name,
+        "(NAME)",
+        f"For the month of {month}, {year}",
+        "Official hours for arrival and departure",
+        "Regular days 8:00 AM - 12:00 PM and 1:00 PM - 5:00 PM",
+        "Saturdays",
+        "Day Arrival Departure Arrival Departure Undertime",
+    ]
+    for day in range(1, 32):
+        if rng.random() < 0.2:
+            lines.append(str(day))
+            continue
+        day_label = "u" if day == 11 and rng.random() < 0.5 else str(day)
+        row = " ".join([
+            day_label,
+            fake_time(8, 10, rng, suffix),
+            fake_time(12, 0, rng, suffix),
+            fake_time(13 if not suffix else 1, 5, rng, suffix),
+            fake_time(17 if not suffix else 5, 0, rng, suffix),
+        ])
+        if rng.random() < 0.1:
+            row += f" {rng.randint(0, 1)} hrs {rng.randint(0, 59)} mins"
+        lines.append(row)
+    lines += [
+        f"TOTAL {rng.randint(120, 176)} hours and {rng.randint(0, 59)} minutes",
+        "I certify on my honor that the above is a true and correct report",
+        "JUAN Z. DELA CRUZ",
+        "Principal",
+    ]
+    return "\n".join(lines)
+
+
+def build_corpus(documents, seed=48):
+    rng = random.Random(seed)
+    return ["\n\n".join(fake_form(rng) for _ in range(rng.randint(1, 3))) for _ in range(documents)]
+
+
+# The parsing half of the original /ocr handler, kept here only as the baseline
+def legacy_parse(full_text):
+    dtr_sections = re.split(r'\n(?=DAILY TIME RECORD)', full_text, flags=re.IGNORECASE)
+
+    def normalize(s):
+        return s.strip().replace("\n", " ") if s else "Not found"
+
+    def is_valid_name(candidate):
+        return (
+            candidate
+            and not re.search(r'(DAILY TIME RECORD|FORM|CSC|OFFICIAL HOURS|REGULA|MONTH)', candidate.upper())
+            and not re.match(r'^[A-Za-z]+\s+\d{1,2}[-–]\d{1,2},\s*\d{4}$', candidate)
+            and len(candidate.split()) >= 2
+            and not any(char.isdigit() for char in candidate)
+        )
+
+    extracted_data = []
+    daily_pattern = re.compile(
+        r'^([uU]|\d{1,2})\s+'
+        r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+        r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+        r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+        r'(\d{1,2}:\d{2}\s*[APapmM]*)\s*'
+        r'(?:(\d+)\s*hrs?\s*(\d+)\s*mins?)?',
+        re.MULTILINE | re.IGNORECASE
+    )
+
+    for dtr_text in dtr_sections:
+        lines = [line.strip() for line in dtr_text.splitlines() if line.strip()]
+        name = "Not found"
+        for i, line in enumerate(lines):
+            if "NAME" in line.upper():
+                parts = re.split(r'NAME', line, flags=re.IGNORECASE)
+                if len(parts) > 1 and is_valid_name(parts[0].strip()):
+                    name = parts[0].strip()
+                    break
+                elif i > 0 and is_valid_name(lines[i - 1]):
+                    name = lines[i - 1]
+                    break
+                elif i + 1 < len(lines) and is_valid_name(lines[i + 1]):
+                    name = lines[i + 1]
+                    break
+
+        month_year_match = re.search(r'([A-Za-z]+),\s*(\d{4})', dtr_text)
+        working_hours = "Not found"
+        working_match = re.search(
+            r'Regular\s+days\s+'
+            r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
+            r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s+and\s+'
+            r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
+            r'(\d{1,2}:\d{2})\s*([aApP][mM])?',
+            dtr_text,
+            re.IGNORECASE
+        )
+        if working_match:
+            morning_start = f"{working_match.group(1)} {working_match.group(2) or ''}".strip()
+            morning_end = f"{working_match.group(3)} {working_match.group(4) or ''}".strip()
+            afternoon_start = f"{working_match.group(5)} {working_match.group(6) or ''}".strip()
+            afternoon_end = f"{working_match.group(7)} {working_match.group(8) or ''}".strip()
+            working_hours = f"{morning_start} - {morning_end} and {afternoon_start} - {afternoon_end}"
+
+        verified_match = re.search(r'\b(JUAN Z\. DELA CRUZ)\b', dtr_text, re.IGNORECASE)
+        position_match = re.search(r'\b(Principal|Manager|Supervisor)\b', dtr_text, re.IGNORECASE)
+        total_time_match = re.search(r'\bTOTAL\s+(\d+\s+hours\s+and\s+\d+\s+minutes)\b', dtr_text, re.IGNORECASE)
+
+        daily_entries = []
+        for match in daily_pattern.finditer(dtr_text):
+            day_str = match.group(1).upper()
+            day = 11 if day_str == 'U' else int(day_str)
+            if day < 1 or day > 31:
+                continue
+
+            def format_time(t):
+                return re.sub(r'\s+', '', t).upper()
+
+            daily_entries.append({
+                "day": day,
+                "am_arrival": format_time(match.group(2)),
+                "am_departure": format_time(match.group(3)),
+                "pm_arrival": format_time(match.group(4)),
+                "pm_departure": format_time(match.group(5)),
+                "undertime_hours": int(match.group(6)) if match.group(6) else 0,
+                "undertime_minutes": int(match.group(7)) if match.group(7) else 0
+            })
+
+        extracted_data.append({
+            "name": normalize(name),
+            "month": month_year_match.group(1).strip().capitalize() if month_year_match else None,
+            "year": int(month_year_match.group(2).strip()) if month_year_match else None,
+            "workingHours": normalize(working_hours),
+            "verifiedBy": normalize(verified_match.group(1)) if verified_match else "Not found",
+            "position": normalize(position_match.group(1)) if position_match else "Not found",
+            "totalTime": normalize(total_time_match.group(1)) if total_time_match else "Not found",
+            "dailyRecords": daily_entries
+        })
+
+    return extracted_data
+
+
+def time_parser(parse, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            parse(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.documents)
+    mismatches = sum(1 for text in corpus if legacy_parse(text) != dtr_parser.parse_dtr_text(text))
+    sections = sum(len(dtr_parser.split_sections(text)) for text in corpus)
+    print(f"corpus: {len(corpus)} uploads, {sections} DTR sections, {mismatches} mismatching results")
+
+    legacy = time_parser(legacy_parse, corpus, args.repeat)
+    current = time_parser(dtr_parser.parse_dtr_text, corpus, args.repeat)
+    print(f"  legacy: {legacy * 1000:.1f} ms ({legacy / sections * 1e6:.1f} us/section)")
+    print(f"  parser: {current * 1000:.1f} ms ({current / sections * 1e6:.1f} us/section)")
+    print(f" speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
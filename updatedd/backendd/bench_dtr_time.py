@@ -0,0 +1,127 @@
+"""
+Benchmark for dtr_time against the datetime.strptime code compute_salary used.
+
+Builds a year of office DTR rows (every weekday of every month for each employee),
+checks that daily_hours and schedule_hours agree with the old strptime versions,
+then times both.
+
+    python bench_dtr_time.py --employees 150 --year 2025 --repeat 5
+"""
+import argparse
+import calendar
+import random
+import time
+from datetime import date, datetime
+
+import dtr_attendance
+import dtr_time
+
+
+def fake_time(hour, rng, jitter):
+    return f"{hour}:{rng.randint(0, jitter):02d}"
+
+
+def build_year(employees, year, seed=48):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(employees):
+        for month in range(1, 13):
+            for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                if date(year, month, day).weekday() >= 5 or rng.random() < 0.05:
+                    continue
+                rows.append({
+                    "day": day,
+                    "am_arrival": fake_time(rng.choice([7, 8]), rng, 59),
+                    "am_departure": fake_time(12, rng, 5),
+                    "pm_arrival": fake_time(13, rng, 15),
+                    "pm_departure": fake_time(rng.choice([16, 17]), rng, 59),
+                    "undertime_hours": 0,
+                    "undertime_minutes": rng.choice([0, 0, 0, 15]),
+                })
+    return rows
+
+
+# The strptime versions from compute_salary and main.py, kept here only as the baseline
+def legacy_daily_hours(e):
+    try:
+        times = [
+            datetime.strptime(e[period], "%H:%M")
+            for period in ['am_arrival', 'am_departure', 'pm_arrival', 'pm_departure']
+            if e.get(period)
+        ]
+        if len(times) != 4:
+            return 0.0
+        return (times[1] - times[0] + times[3] - times[2]).seconds / 3600
+    except:
+        return 0.0
+
+
+def legacy_clamp_time(actual_str, expected_str, direction="in"):
+    actual = datetime.strptime(actual_str, "%H:%M").time()
+    expected = datetime.strptime(expected_str, "%H:%M").time()
+    return max(actual, expected) if direction == "in" else min(actual, expected)
+
+
+def legacy_minutes_between(t1, t2):
+    return (datetime.combine(datetime.today(), t2) - datetime.combine(datetime.today(), t1)).seconds / 60
+
+
+def legacy_schedule_hours(entry):
+    try:
+        am_minutes, pm_minutes = 0, 0
+
+        if entry["am_arrival"] and entry["am_departure"]:
+            am_arrival = legacy_clamp_time(entry["am_arrival"], "08:00", "in")
+            am_departure = legacy_clamp_time(entry["am_departure"], "12:00", "out")
+            am_minutes = max(legacy_minutes_between(am_arrival, am_departure), 0)
+
+        if entry["pm_arrival"] and entry["pm_departure"]:
+            pm_arrival = legacy_clamp_time(entry["pm_arrival"], "13:00", "in")
+            pm_departure = legacy_clamp_time(entry["pm_departure"], "17:00", "out")
+            pm_minutes = max(legacy_minutes_between(pm_arrival, pm_departure), 0)
+
+        undertime = (entry.get("undertime_hours", 0) * 60) + entry.get("undertime_minutes", 0)
+        return max((am_minutes + pm_minutes - undertime) / 60, 0)
+    except:
+        return 0
+
+
+def time_rows(compute, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for row in rows:
+            compute(row)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=150)
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = build_year(args.employees, args.year)
+    print(f"corpus: {args.employees} employees, {len(rows)} day rows for {args.year}")
+
+    for label, legacy, current in (
+        ("daily_hours", legacy_daily_hours, dtr_attendance.daily_hours),
+        ("schedule_hours", legacy_schedule_hours, dtr_attendance.schedule_hours),
+    ):
+        mismatches = sum(1 for row in rows if abs(legacy(row) - current(row)) > 1e-9)
+        dtr_time.parse_time.cache_clear()
+        old = time_rows(legacy, rows, args.repeat)
+        new = time_rows(current, rows, args.repeat)
+        print(f"{label}: {mismatches} mismatching rows")
+        print(f"  strptime: {old * 1000:.1f} ms ({old / len(rows) * 1e6:.2f} us/row)")
+        print(f"  dtr_time: {new * 1000:.1f} ms ({new / len(rows) * 1e6:.2f} us/row)")
+        print(f"   speedup: {old / new:.2f}x")
+
+    info = dtr_time.parse_time.cache_info()
+    print(f"parse cache: {info.currsize} distinct values, {info.hits} hits, {info.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
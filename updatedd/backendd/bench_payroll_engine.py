@@ -0,0 +1,146 @@
+"""
+Benchmark for payroll_engine on synthetic employees, starting from raw day rows:
+compute_period (one employee at a time) against compute_period_columnar (NumPy),
+both given the day rows as days_by_dtr instead of dtr_attendance rows.
+
+No database needed. Checks that both produce the same payslips, then times them.
+
+    python bench_payroll_engine.py --employees 5000 --repeat 3
+"""
+import argparse
+import random
+import time
+
+import loan_schedule
+import payroll_engine
+import work_calendar
+from dtr_attendance import summarize_days, summarize_days_columnar
+from dtr_time import TIME_FIELDS
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+COMPARED = ("working_days", "days_present", "days_absent", "leave_used", "total_hours",
+            "gross_income", "bonuses", "loan_deduction", "total_deductions", "net_income")
+
+
+def fake_time(hour, rng, jitter=15):
+    minute = rng.randint(0, jitter)
+    return f"{hour}:{minute:02d}"
+
+
+def fake_period(employees, month, year, seed=48):
+    rng = random.Random(seed)
+    dtrs, days_by_dtr, profiles, loans, bonuses = [], {}, {}, {}, {}
+    for user_id in range(1, employees + 1):
+        dtr_id = 1000 + user_id
+        dtrs.append({"id": dtr_id, "user_id": user_id, "month": month, "year": year,
+                     "employee_name": f"EMPLOYEE {user_id}"})
+        days = []
+        for day in range(1, 32):
+            if rng.random() < 0.15:
+                continue
+            entry = {
+                "day": day,
+                "am_arrival": fake_time(8, rng),
+                "am_departure": fake_time(12, rng, 5),
+                "pm_arrival": fake_time(13, rng),
+                "pm_departure": fake_time(17, rng, 30),
+                "undertime_hours": 0,
+                "undertime_minutes": 0,
+            }
+            if rng.random() < 0.05:
+                entry[rng.choice(TIME_FIELDS)] = ""
+            days.append(entry)
+        days_by_dtr[dtr_id] = days
+
+        monthly = rng.choice([18000, 23000, 27000, 35000, 42000])
+        profiles[user_id] = {
+            "user_id": user_id,
+            "employment_type": "irregular" if rng.random() < 0.2 else "regular",
+            "base_salary_hour": round(monthly / 22 / 8, 2),
+            "base_monthly_salary": monthly,
+            "leave_credits": rng.randint(0, 15),
+            "gsis_deduction": round(monthly * 0.09, 2),
+            "philhealth_deduction": round(monthly * 0.025, 2),
+            "tax_deduction": rng.choice([0, 500, 1250]),
+        }
+        # The period's loan_schedule rows, as payroll_run.load_period returns them
+        loans[user_id] = [
+            {"loan_id": loan_id, "user_id": user_id, "loan_name": f"Loan {loan_id}", "payment": payment,
+             "balance_after": balance_after}
+            for i in range(rng.randint(0, 2))
+            for loan_id, _, row_year, month_num, payment, balance_after in loan_schedule.build_schedule(
+                {"id": user_id * 10 + i, "user_id": user_id,
+                 "amount": rng.choice([12000, 24000, 60000]), "duration_months": rng.choice([12, 24, 36]),
+                 "start_month": rng.choice(["01", "March", "june"]), "start_year": str(year - rng.randint(0, 1))}
+            )
+            if (row_year, month_num) == (year, work_calendar.month_number(month))
+        ]
+        bonuses[user_id] = [
+            {"user_id": user_id, "amount": 2000, "frequency": rng.choice(["monthly", "yearly"]),
+             "bonus_type": "allowance", "bonus_name": "PERA"}
+            for _ in range(rng.randint(0, 1))
+        ]
+    return dtrs, days_by_dtr, profiles, loans, bonuses
+
+
+def mismatches(expected, actual):
+    count = 0
+    for a, b in zip(expected, actual):
+        if any(abs(float(a[key]) - float(b[key])) > 0.005 for key in COMPARED):
+            count += 1
+        elif a["new_leave_credits"] != b["new_leave_credits"]:
+            count += 1
+    return count + abs(len(expected) - len(actual))
+
+
+def scalar_run(dtrs, days_by_dtr, *rest):
+    return payroll_engine.compute_period(dtrs, {}, *rest, days_by_dtr=days_by_dtr)
+
+
+def columnar_run(dtrs, days_by_dtr, *rest):
+    return payroll_engine.compute_period_columnar(dtrs, {}, *rest, days_by_dtr=days_by_dtr)
+
+
+def time_engine(compute, inputs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compute(*inputs)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--month", default="May", choices=MONTHS)
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    inputs = fake_period(args.employees, args.month, args.year)
+    rows = sum(len(days) for days in inputs[1].values())
+    print(f"period: {args.month} {args.year}, {args.employees} employees, {rows} day rows")
+
+    scalar = time_engine(scalar_run, inputs, args.repeat)
+    print(f"   scalar: {scalar * 1000:.1f} ms ({scalar / args.employees * 1e6:.1f} us/employee)")
+
+    if payroll_engine.np is None:
+        print("columnar: skipped, NumPy is not installed")
+        return
+
+    days_by_dtr = inputs[1]
+    summaries = summarize_days_columnar(days_by_dtr)
+    differing = sum(1 for dtr_id, days in days_by_dtr.items() if summarize_days(days) != summaries[dtr_id])
+    expected, _ = scalar_run(*inputs)
+    actual, _ = columnar_run(*inputs)
+    print(f"  results: {differing} mismatching attendance summaries, {mismatches(expected, actual)} mismatching payslips")
+
+    columnar = time_engine(columnar_run, inputs, args.repeat)
+    print(f" columnar: {columnar * 1000:.1f} ms ({columnar / args.employees * 1e6:.1f} us/employee)")
+    print(f"  speedup: {scalar / columnar:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
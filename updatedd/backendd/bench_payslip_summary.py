@@ -0,0 +1,126 @@
+"""
+Benchmark for the /api/payslip/summary queries against a real database: the
+per-month loop the endpoint used (a payslip, bonus and loan query for every
+selected month) against payslip_summary.load_summary_rows (three queries).
+
+Selects the --months months ending at --month/--year for one user, checks that
+both give the same summary, then times them. Reads only.
+
+    python bench_payslip_summary.py --username jdoe --months 24 --month May --year 2025
+"""
+import argparse
+import calendar
+import time
+from collections import defaultdict
+
+from db_pool import pool
+from payslip_summary import build_summary, load_summary_rows, period_key
+import work_calendar
+
+
+class CountingConnection:
+    """Counts the statements run through cursors of the wrapped connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = 0
+
+    def cursor(self, **kwargs):
+        cursor = self.connection.cursor(**kwargs)
+        execute = cursor.execute
+
+        def counted(*args, **kw):
+            self.statements += 1
+            return execute(*args, **kw)
+
+        cursor.execute = counted
+        return cursor
+
+
+# The per-month queries get_payslip_summary ran before load_summary_rows, kept here only as the baseline
+def legacy_summary_rows(connection, user_id, periods):
+    payslips_by_period, bonuses_by_payslip, loans_by_payslip = {}, defaultdict(list), defaultdict(list)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for month, year in periods:
+            cursor.execute("""
+                SELECT *
+                FROM payslips
+                WHERE user_id = %s AND month = %s AND year = %s
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, (user_id, month, year))
+            payslip = cursor.fetchone()
+            if not payslip:
+                continue
+            payslips_by_period[period_key(month, year)] = payslip
+
+            cursor.execute("SELECT bonus_name, amount FROM payslip_bonuses WHERE payslip_id = %s", (payslip["id"],))
+            bonuses_by_payslip[payslip["id"]] = cursor.fetchall()
+
+            cursor.execute(
+                "SELECT loan_name, amount, balance_after AS balance FROM payslip_loan_deductions WHERE payslip_id = %s",
+                (payslip["id"],)
+            )
+            loans_by_payslip[payslip["id"]] = cursor.fetchall()
+    finally:
+        cursor.close()
+    return payslips_by_period, bonuses_by_payslip, loans_by_payslip
+
+
+def selected_periods(months, month, year):
+    number = work_calendar.month_number(month)
+    periods = []
+    for _ in range(months):
+        periods.append((calendar.month_name[number], year))
+        number, year = (12, year - 1) if number == 1 else (number - 1, year)
+    return periods[::-1]
+
+
+def time_loader(load, connection, user_id, periods, repeat):
+    counting = CountingConnection(connection)
+    best = float("inf")
+    for _ in range(repeat):
+        counting.statements = 0
+        started = time.perf_counter()
+        rows = load(counting, user_id, periods)
+        best = min(best, time.perf_counter() - started)
+    return best, counting.statements, build_summary(periods, *rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--month", default="December", help="Last selected month, e.g. May")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    periods = selected_periods(args.months, args.month, args.year)
+    try:
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT id FROM users WHERE username = %s", (args.username,))
+                user = cursor.fetchone()
+            finally:
+                cursor.close()
+            if not user:
+                raise SystemExit(f"No user {args.username}")
+
+            old, old_statements, expected = time_loader(legacy_summary_rows, connection, user[0], periods, args.repeat)
+            new, new_statements, actual = time_loader(load_summary_rows, connection, user[0], periods, args.repeat)
+    finally:
+        pool.close_all()
+
+    print(f"selection: {periods[0][0]} {periods[0][1]} - {periods[-1][0]} {periods[-1][1]}, "
+          f"{len(expected['months'])} payslips")
+    print(f"  results: {'same' if expected == actual else 'DIFFERENT'}")
+    print(f"per month: {old * 1000:.1f} ms, {old_statements} queries")
+    print(f"set-based: {new * 1000:.1f} ms, {new_statements} queries")
+    print(f"  speedup: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
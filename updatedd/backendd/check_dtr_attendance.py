@@ -0,0 +1,76 @@
+"""
+Consistency check for the dtr_attendance view: recompute every DTR's totals from its
+dtr_days rows with dtr_attendance.summarize_days and compare with what MySQL returns.
+Exits with status 1 when any DTR differs.
+
+    python check_dtr_attendance.py [--limit 500]
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+from db_pool import pool
+from dtr_attendance import summarize_days
+from dtr_time import MINUTE_COLUMNS, TIME_FIELDS
+from payroll_engine import EMPTY_ATTENDANCE
+
+FIELDS = ("day_rows", "total_minutes", "days_present", "late_minutes", "undertime_minutes")
+
+
+def check(cursor, limit=None):
+    """Returns (dtrs_checked, [(dtr_id, field, python_value, sql_value)])."""
+    sql = "SELECT id FROM dtrs ORDER BY id DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    cursor.execute(sql)
+    dtr_ids = [row["id"] for row in cursor.fetchall()]
+    if not dtr_ids:
+        return 0, []
+    placeholders = ", ".join(["%s"] * len(dtr_ids))
+
+    cursor.execute(f"""
+        SELECT dtr_id, {', '.join(TIME_FIELDS)}, {', '.join(MINUTE_COLUMNS)}, undertime_hours, undertime_minutes
+        FROM dtr_days WHERE dtr_id IN ({placeholders})
+    """, dtr_ids)
+    days_by_dtr = defaultdict(list)
+    for row in cursor.fetchall():
+        days_by_dtr[row["dtr_id"]].append(row)
+
+    cursor.execute(f"SELECT * FROM dtr_attendance WHERE dtr_id IN ({placeholders})", dtr_ids)
+    sql_by_dtr = {row["dtr_id"]: row for row in cursor.fetchall()}
+
+    differences = []
+    for dtr_id in dtr_ids:
+        expected = summarize_days(days_by_dtr.get(dtr_id, []))
+        actual = sql_by_dtr.get(dtr_id, EMPTY_ATTENDANCE)
+        for field in FIELDS:
+            if expected[field] != int(actual[field]):
+                differences.append((dtr_id, field, expected[field], int(actual[field])))
+    return len(dtr_ids), differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, help="Only check the newest N DTRs")
+    args = parser.parse_args()
+
+    try:
+        with pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                checked, differences = check(cursor, args.limit)
+            finally:
+                cursor.close()
+    finally:
+        pool.close_all()
+
+    print(f"Checked {checked} DTRs, {len(differences)} differences")
+    for dtr_id, field, expected, actual in differences[:50]:
+        print(f"  dtr {dtr_id} {field}: python {expected}, view {actual}")
+    if differences:
+        print("Rows with NULL *_min columns may need python backfill_dtr_minutes.py")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from fastapi import HTTPException
+
+from db_pool import pool, PoolTimeout
+
+# One thread per connection the pool can hand out
+db_executor = ThreadPoolExecutor(
+    max_workers=pool.size + pool.max_overflow,
+    thread_name_prefix="db",
+)
+
+# Coroutines wait here, not in pool.acquire on a db thread. Each slot holder uses at most
+# one thread at a time, so requests waiting for a connection can never take every thread
+# and stall the queries of requests that already hold one.
+_connection_slots = asyncio.Semaphore(pool.size + pool.max_overflow)
+
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(fn, *args, **kwargs))
+
+
+async def _take_slot():
+    try:
+        await asyncio.wait_for(_connection_slots.acquire(), pool.timeout)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f"No database connection available after {pool.timeout}s")
+
+
+async def run_pooled(fn, *args, **kwargs):
+    """run_in_db_thread for functions that take their own connection from the pool."""
+    await _take_slot()
+    try:
+        return await run_in_db_thread(fn, *args, **kwargs)
+    finally:
+        _connection_slots.release()
+
+
+class AsyncCursor:
+    """
+    aiomysql-style cursor over a blocking mysql.connector cursor.
+    Every call that may touch the network runs on the db executor.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, query, params=None):
+        return await run_in_db_thread(self._cursor.execute, query, params)
+
+    async def executemany(self, query, seq_params):
+        return await run_in_db_thread(self._cursor.executemany, query, seq_params)
+
+    async def fetchone(self):
+        return await run_in_db_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await run_in_db_thread(self._cursor.fetchall)
+
+    async def close(self):
+        return await run_in_db_thread(self._cursor.close)
+
+
+class AsyncConnection:
+    def __init__(self, connection):
+        self.raw = connection
+
+    def cursor(self, **kwargs):
+        # Buffered so fetches after execute don't go back to the server
+        kwargs.setdefault("buffered", True)
+        return AsyncCursor(self.raw.cursor(**kwargs))
+
+    async def commit(self):
+        return await run_in_db_thread(self.raw.commit)
+
+    async def rollback(self):
+        return await run_in_db_thread(self.raw.rollback)
+
+
+# FastAPI dependency for async def endpoints
+async def get_async_db():
+    try:
+        await _take_slot()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        try:
+            connection = await run_in_db_thread(pool.acquire)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        try:
+            yield AsyncConnection(connection)
+        finally:
+            await run_in_db_thread(pool.release, connection)
+    finally:
+        _connection_slots.release()
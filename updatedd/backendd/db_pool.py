@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from fastapi import HTTPException
+
+# MySQL configuration
+db_config = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "payslip"),
+}
+
+# Pool settings
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))                 # connections kept open
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))  # extra connections allowed under load
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))        # seconds before a connection is reopened
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"     # health-check on checkout
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))        # seconds to wait for a free connection
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of mysql.connector connections.
+    Keeps `size` connections open, allows `max_overflow` extra ones under load
+    (closed again on release) and blocks callers beyond that until one is returned.
+    """
+
+    def __init__(self, config, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING, timeout=POOL_TIMEOUT):
+        self.config = config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._born = {}
+        self._total = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self._checked_out = 0
+        self._waiters = 0
+        self._checkouts = 0
+        self._wait_count = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        conn = None
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+            wait_time = time.monotonic() - started
+            self._checked_out += 1
+            self._checkouts += 1
+            if waited:
+                self._wait_count += 1
+                self._wait_time += wait_time
+                self._max_wait = max(self._max_wait, wait_time)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif self.recycle >= 0 and time.monotonic() - self._born.get(id(conn), 0) > self.recycle:
+                self._discard(conn)
+                self._recycled += 1
+                conn = self._connect()
+            elif self.pre_ping:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._ping_failures += 1
+                    self._discard(conn)
+                    conn = self._connect()
+        except Exception:
+            # Give the slot back so a failed connect doesn't shrink the pool
+            with self._cond:
+                self._total -= 1
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+        return conn
+
+    def release(self, conn):
+        keep = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            keep = False
+
+        with self._cond:
+            self._checked_out -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append(conn)
+            else:
+                self._total -= 1
+                self._discard(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._total -= 1
+                self._discard(self._idle.pop())
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._total,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "overflow": max(self._total - self.size, 0),
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "waits": self._wait_count,
+                "wait_time_total": round(self._wait_time, 4),
+                "wait_time_avg": round(self._wait_time / self._wait_count, 4) if self._wait_count else 0.0,
+                "wait_time_max": round(self._max_wait, 4),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+            }
+
+
+pool = ConnectionPool(db_config)
+
+
+# FastAPI dependency
+def get_db():
+    try:
+        connection = pool.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        yield connection
+    finally:
+        pool.release(connection)
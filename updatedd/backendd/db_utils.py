@@ -0,0 +1,38 @@
+# Rows per INSERT statement, keeps packets well under max_allowed_packet
+INSERT_CHUNK_SIZE = 1000
+
+
+def insert_rows(cursor, table, columns, rows, suffix=""):
+    """
+    Insert many rows with multi-row INSERT statements (one per INSERT_CHUNK_SIZE rows).
+    suffix is appended to each statement, e.g. an ON DUPLICATE KEY UPDATE clause.
+    Returns the total affected row count.
+    """
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    affected = 0
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(chunk))} {suffix}",
+            [value for row in chunk for value in row]
+        )
+        affected += cursor.rowcount
+    return affected
+
+
+def update_by_key(cursor, table, key, column, values):
+    """
+    Set column to a per-row value in one UPDATE ... CASE statement per chunk.
+    values maps key value -> new column value. Returns the total affected row count.
+    """
+    items = list(values.items())
+    affected = 0
+    for start in range(0, len(items), INSERT_CHUNK_SIZE):
+        chunk = items[start:start + INSERT_CHUNK_SIZE]
+        cursor.execute(
+            f"UPDATE {table} SET {column} = CASE {key} {' '.join(['WHEN %s THEN %s'] * len(chunk))} END "
+            f"WHERE {key} IN ({', '.join(['%s'] * len(chunk))})",
+            [value for pair in chunk for value in pair] + [k for k, _ in chunk]
+        )
+        affected += cursor.rowcount
+    return affected
@@ -0,0 +1,142 @@
+"""
+Attendance from raw dtr_days rows: the Python version of the dtr_attendance view.
+
+Payroll normally reads one dtr_attendance row per DTR from MySQL. These helpers give
+the same figures from day rows in memory, for payroll_engine runs without a database
+(what-if runs, benchmarks) and for check_dtr_attendance, which compares the two.
+summarize_days handles one DTR; summarize_days_columnar does many at once with NumPy.
+"""
+from dtr_time import (
+    AM_END, AM_START, MINUTE_COLUMNS, MINUTES_PER_DAY, PM_END, PM_START, TIME_FIELDS,
+    entry_minutes, minutes_between, parse_time
+)
+
+try:
+    import numpy as np
+except ImportError:  # optional, only the columnar path needs it
+    np = None
+
+
+def daily_minutes(entry):
+    times = entry_minutes(entry)
+    if None in times:
+        return 0
+    # Same wrap-around as the timedelta.seconds this replaced
+    return (times[1] - times[0] + times[3] - times[2]) % MINUTES_PER_DAY
+
+
+def daily_hours(entry):
+    return daily_minutes(entry) / 60
+
+
+def clamp_time(actual, expected, direction="in"):
+    return max(actual, expected) if direction == "in" else min(actual, expected)
+
+
+def schedule_hours(entry):
+    """Hours inside the 8-12 / 1-5 schedule, less recorded undertime."""
+    am_minutes, pm_minutes = 0, 0
+    am_arrival, am_departure, pm_arrival, pm_departure = entry_minutes(entry)
+
+    if entry.get("am_arrival") and entry.get("am_departure"):
+        if am_arrival is None or am_departure is None:
+            return 0
+        am_minutes = minutes_between(clamp_time(am_arrival, AM_START, "in"), clamp_time(am_departure, AM_END, "out"))
+
+    if entry.get("pm_arrival") and entry.get("pm_departure"):
+        if pm_arrival is None or pm_departure is None:
+            return 0
+        pm_minutes = minutes_between(clamp_time(pm_arrival, PM_START, "in"), clamp_time(pm_departure, PM_END, "out"))
+
+    undertime = ((entry.get("undertime_hours") or 0) * 60) + (entry.get("undertime_minutes") or 0)
+    return max((am_minutes + pm_minutes - undertime) / 60, 0)
+
+
+def is_present(entry):
+    return bool(entry.get("am_arrival") and entry.get("pm_arrival"))
+
+
+def late_minutes(entry):
+    am_arrival, _, pm_arrival, _ = entry_minutes(entry)
+    late = 0
+    if am_arrival is not None:
+        late += max(am_arrival - AM_START, 0)
+    if pm_arrival is not None:
+        late += max(pm_arrival - PM_START, 0)
+    return late
+
+
+def undertime_minutes(entry):
+    return (entry.get("undertime_hours") or 0) * 60 + (entry.get("undertime_minutes") or 0)
+
+
+def summarize_days(day_entries):
+    """Attendance totals for one DTR's dtr_days rows, matching a dtr_attendance row."""
+    return {
+        "day_rows": len(day_entries),
+        "total_minutes": sum(daily_minutes(e) for e in day_entries),
+        "days_present": sum(1 for e in day_entries if is_present(e)),
+        "late_minutes": sum(late_minutes(e) for e in day_entries),
+        "undertime_minutes": sum(undertime_minutes(e) for e in day_entries),
+    }
+
+
+def time_column(rows, field, column):
+    """Minutes for one time field over many rows; stored *_min values first, NaN where missing."""
+    minutes = [e.get(column) for e in rows]
+    if None in minutes:
+        minutes = [m if m is not None else parse_time(e.get(field)) for m, e in zip(minutes, rows)]
+    return np.array(minutes, dtype=np.float64)
+
+
+def day_columns(day_entries_by_row):
+    """
+    Flatten day rows into columns: (owner, am_in, am_out, pm_in, pm_out, complete, present).
+    owner is the position of the employee in day_entries_by_row. Times are minutes of
+    day; complete marks rows where all four parse, present mirrors is_present.
+    """
+    rows = [e for entries in day_entries_by_row for e in entries]
+    owner = np.repeat(np.arange(len(day_entries_by_row)), [len(entries) for entries in day_entries_by_row])
+    times = [time_column(rows, field, column) for field, column in zip(TIME_FIELDS, MINUTE_COLUMNS)]
+    complete = ~np.isnan(times[0]) & ~np.isnan(times[1]) & ~np.isnan(times[2]) & ~np.isnan(times[3])
+    present = np.array([bool(e.get("am_arrival") and e.get("pm_arrival")) for e in rows], dtype=bool)
+    return (
+        owner.astype(np.int64),
+        *(np.nan_to_num(column).astype(np.int64) for column in times),
+        complete,
+        present,
+    )
+
+
+def summarize_days_columnar(days_by_dtr):
+    """summarize_days for many DTRs at once: {dtr_id: attendance} from {dtr_id: [day rows]}."""
+    if np is None:
+        raise RuntimeError("NumPy is not installed, use summarize_days")
+
+    dtr_ids = list(days_by_dtr)
+    day_entries_by_row = [days_by_dtr[dtr_id] for dtr_id in dtr_ids]
+    rows = [e for entries in day_entries_by_row for e in entries]
+    owner, am_in, am_out, pm_in, pm_out, complete, present = day_columns(day_entries_by_row)
+    employees = len(dtr_ids)
+
+    # Same wrap-around as daily_minutes
+    minutes = np.where(complete, np.mod((am_out - am_in) + (pm_out - pm_in), MINUTES_PER_DAY), 0)
+    # day_columns turns missing times into 0, which is never late
+    late = np.maximum(am_in - AM_START, 0) + np.maximum(pm_in - PM_START, 0)
+    undertime = np.array([undertime_minutes(e) for e in rows], dtype=np.int64)
+
+    def per_dtr(values):
+        return np.bincount(owner, weights=values, minlength=employees).astype(np.int64)
+
+    day_rows = np.bincount(owner, minlength=employees)
+    totals = [per_dtr(minutes), per_dtr(present), per_dtr(late), per_dtr(undertime)]
+    return {
+        dtr_id: {
+            "day_rows": int(day_rows[i]),
+            "total_minutes": int(totals[0][i]),
+            "days_present": int(totals[1][i]),
+            "late_minutes": int(totals[2][i]),
+            "undertime_minutes": int(totals[3][i]),
+        }
+        for i, dtr_id in enumerate(dtr_ids)
+    }
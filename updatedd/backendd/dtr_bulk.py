@@ -0,0 +1,191 @@
+import asyncio
+import io
+import os
+import traceback
+import zipfile
+
+import mysql.connector
+from fastapi import HTTPException
+
+from db_async import run_pooled
+from db_pool import pool
+from dtr_ingest import parse_dtr_sections, store_dtr
+from ocr_workers import OCR_WORKERS, ocr_document
+
+# Bulk upload settings
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 20))                     # files written per transaction
+BULK_OCR_FILES = int(os.getenv("BULK_OCR_FILES", OCR_WORKERS))              # files in OCR at the same time
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", 1000))
+BULK_MAX_UNZIPPED_BYTES = int(os.getenv("BULK_MAX_UNZIPPED_BYTES", 500 * 1024 * 1024))
+
+OCR_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+
+def expand_uploads(uploads):
+    """
+    Turn the uploaded (filename, bytes) pairs into DTR files, unpacking any ZIP archives.
+    Returns (files, rejected) where rejected holds per-file results for skipped entries.
+    """
+    files, rejected = [], []
+    for filename, contents in uploads:
+        if not filename.lower().endswith(".zip"):
+            files.append((filename, contents))
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+                entries = [
+                    info for info in archive.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                ]
+                if sum(info.file_size for info in entries) > BULK_MAX_UNZIPPED_BYTES:
+                    raise HTTPException(status_code=413, detail=f"{filename} is too large once extracted")
+                for info in entries:
+                    files.append((f"{filename}/{info.filename}", archive.read(info)))
+        except zipfile.BadZipFile:
+            rejected.append(_result(filename, "failed", "Not a valid ZIP archive"))
+
+    kept = []
+    for filename, contents in files:
+        if filename.lower().endswith(OCR_EXTENSIONS):
+            kept.append((filename, contents))
+        else:
+            rejected.append(_result(filename, "failed", "Unsupported file type"))
+
+    if len(kept) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files ({len(kept)}), the limit is {BULK_MAX_FILES}")
+    return kept, rejected
+
+
+def _result(filename, status, detail=None):
+    return {"filename": filename, "status": status, "detail": detail, "dtrs": []}
+
+
+def load_users():
+    with pool.connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT id, username, full_name FROM users")
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def match_user(name, users):
+    """Same rule as /ocr: the account's full name must appear in the DTR name. Longest match wins."""
+    candidates = [u for u in users if u["full_name"] and u["full_name"].strip().upper() in name.upper()]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda u: len(u["full_name"].strip()))
+
+
+def write_batch(batch, replace_existing):
+    """
+    Write a batch of matched files in one transaction.
+    Each file gets a savepoint so a conflict or error only rolls back that file.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            connection.start_transaction()
+            for i, item in enumerate(batch):
+                result = item["result"]
+                savepoint = f"bulk_file_{i}"
+                cursor.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    for parsed, user in item["sections"]:
+                        store_dtr(cursor, user["id"], parsed, replace_existing)
+                    result["status"] = "success"
+                except HTTPException as e:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    result["status"] = "conflict" if e.status_code == 409 else "failed"
+                    result["detail"] = e.detail
+                except mysql.connector.Error as err:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    result["status"] = "failed"
+                    result["detail"] = f"Database error: {err.msg}"
+                except Exception as err:
+                    traceback.print_exc()
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    result["status"] = "failed"
+                    result["detail"] = f"Could not store DTR: {str(err)}"
+            connection.commit()
+        except mysql.connector.Error as err:
+            connection.rollback()
+            fail_batch(batch, f"Database error: {err.msg}")
+        finally:
+            cursor.close()
+
+
+def fail_batch(batch, detail):
+    # Nothing of an uncommitted batch was stored
+    for item in batch:
+        if item["result"]["status"] in ("pending", "success"):
+            item["result"]["status"] = "failed"
+            item["result"]["detail"] = detail
+
+
+async def _ocr_and_parse(filename, contents):
+    result = _result(filename, "pending")
+    try:
+        page_texts = await ocr_document(contents, filename, wait=True)
+        return result, parse_dtr_sections("\n\n".join(page_texts))
+    except HTTPException as e:
+        result["status"] = "failed"
+        result["detail"] = e.detail
+    except Exception as err:
+        traceback.print_exc()
+        result["status"] = "failed"
+        result["detail"] = f"OCR processing failed: {str(err)}"
+    return result, []
+
+
+async def ingest_bulk(uploads, replace_existing=False):
+    files, results = expand_uploads(uploads)
+
+    # A few files at a time, enough to keep the workers busy; the rest are not spooled or queued yet
+    slots = asyncio.Semaphore(max(BULK_OCR_FILES, 1))
+
+    async def ocr_file(name, data):
+        async with slots:
+            return await _ocr_and_parse(name, data)
+
+    parsed_files = await asyncio.gather(*(ocr_file(name, data) for name, data in files))
+    users = await run_pooled(load_users)
+
+    to_write = []
+    for result, sections in parsed_files:
+        results.append(result)
+        if result["status"] != "pending":
+            continue
+
+        matched = []
+        for parsed in sections:
+            user = match_user(parsed["name"], users)
+            if not user:
+                result["status"] = "failed"
+                result["detail"] = f"No user matches DTR name '{parsed['name']}'"
+                break
+            matched.append((parsed, user))
+            result["dtrs"].append({
+                "name": parsed["name"],
+                "username": user["username"],
+                "month": parsed["month"],
+                "year": parsed["year"],
+                "days": len(parsed["dailyRecords"])
+            })
+        if result["status"] == "pending":
+            to_write.append({"result": result, "sections": matched})
+
+    for start in range(0, len(to_write), BULK_BATCH_SIZE):
+        batch = to_write[start:start + BULK_BATCH_SIZE]
+        try:
+            await run_pooled(write_batch, batch, replace_existing)
+        except Exception as err:
+            # Earlier batches are committed; report this one per file and carry on
+            traceback.print_exc()
+            fail_batch(batch, f"Could not store DTR: {str(err)}")
+
+    summary = {"success": 0, "conflict": 0, "failed": 0}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return {"files": results, "summary": summary}
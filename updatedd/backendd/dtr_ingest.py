@@ -0,0 +1,109 @@
+import mysql.connector
+from fastapi import HTTPException
+
+import dtr_parser
+from db_utils import insert_rows
+from dtr_time import parse_time
+
+
+def parse_dtr_sections(full_text):
+    """
+    Split OCR text into DTR sections and parse each one.
+    Returns a list of parsed DTR dicts (no database access).
+    """
+    extracted_data = dtr_parser.parse_dtr_text(full_text)
+    if not extracted_data:
+        raise HTTPException(status_code=400, detail="No DTR found")
+    for parsed in extracted_data:
+        if parsed["month"] is None:
+            raise HTTPException(status_code=400, detail="Could not extract month and year from DTR")
+    return extracted_data
+
+
+DTR_COLUMNS = ("user_id", "employee_name", "month", "year", "working_hours", "verified_by", "position", "total_time")
+DTR_DAY_COLUMNS = (
+    "dtr_id", "day", "am_arrival", "am_departure", "pm_arrival", "pm_departure", "undertime_hours", "undertime_minutes",
+    "am_arrival_min", "am_departure_min", "pm_arrival_min", "pm_departure_min"
+)
+
+# Replacing keeps the DTR row (and its id) and resets it to a fresh upload
+DTR_UPSERT = """
+    ON DUPLICATE KEY UPDATE
+        id = LAST_INSERT_ID(id),
+        employee_name = VALUES(employee_name),
+        working_hours = VALUES(working_hours),
+        verified_by = VALUES(verified_by),
+        position = VALUES(position),
+        total_time = VALUES(total_time),
+        status = 'pending',
+        uploaded_at = CURRENT_TIMESTAMP,
+        processed_at = NULL
+"""
+
+ER_DUP_ENTRY = 1062
+
+
+def store_dtr(cursor, user_id, parsed, replace_existing=False):
+    """
+    Write one parsed DTR and its days. Does not commit.
+    Relies on the (user_id, year, month) unique key: a plain INSERT when replacing is
+    off (duplicate -> HTTPException 409), an upsert when it is on.
+    """
+    header = (
+        user_id, parsed["name"], parsed["month"], parsed["year"], parsed["workingHours"],
+        parsed["verifiedBy"], parsed["position"], parsed["totalTime"]
+    )
+    try:
+        insert_rows(cursor, "dtrs", DTR_COLUMNS, [header], DTR_UPSERT if replace_existing else "")
+    except mysql.connector.Error as err:
+        if err.errno == ER_DUP_ENTRY:
+            raise HTTPException(
+                status_code=409,
+                detail=f"You already uploaded a DTR for {parsed['month']}. Set 'replace_existing' to true to replace it."
+            )
+        raise
+    dtr_id = cursor.lastrowid
+
+    # The affected-row count can't tell a fresh insert from a replace (it depends on
+    # CLIENT_FOUND_ROWS), so always clear the days; a new DTR has none
+    if replace_existing:
+        cursor.execute("DELETE FROM dtr_days WHERE dtr_id = %s", (dtr_id,))
+
+    day_rows = [
+        (
+            dtr_id, d["day"], d["am_arrival"], d["am_departure"], d["pm_arrival"], d["pm_departure"],
+            d["undertime_hours"], d["undertime_minutes"],
+            parse_time(d["am_arrival"]), parse_time(d["am_departure"]),
+            parse_time(d["pm_arrival"]), parse_time(d["pm_departure"])
+        )
+        for d in parsed["dailyRecords"]
+    ]
+    if day_rows:
+        insert_rows(cursor, "dtr_days", DTR_DAY_COLUMNS, day_rows)
+
+    return dtr_id
+
+
+def ingest_dtr_text(connection, user_id, full_name, full_text, replace_existing=False):
+    """
+    Parse OCR text into DTR sections and store them in dtrs/dtr_days in one transaction.
+    Returns the parsed DTRs. Raises HTTPException for name/month/duplicate problems.
+    """
+    extracted_data = parse_dtr_sections(full_text)
+    for parsed in extracted_data:
+        if full_name not in parsed["name"].upper():
+            raise HTTPException(status_code=403, detail=f"DTR belongs to {parsed['name']}, not the logged-in user.")
+
+    # No start_transaction(): with autocommit off the caller may already be inside the
+    # implicit transaction of an earlier query, so just commit or roll back that one
+    cursor = connection.cursor()
+    try:
+        for parsed in extracted_data:
+            store_dtr(cursor, user_id, parsed, replace_existing)
+        connection.commit()
+        return extracted_data
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,170 @@
+"""
+DTR (CSC Form 48) text parser.
+
+Works on OCR text only - no Tesseract or MySQL needed, so it can be tested and
+benchmarked on its own. Each section is read in one pass over its lines; the few
+fields that OCR sometimes wraps across lines fall back to a search of the whole
+section only when the line pass found nothing.
+"""
+import re
+
+# Section boundaries
+SECTION_SPLIT = re.compile(r'\n(?=DAILY TIME RECORD)', re.IGNORECASE)
+
+# Name candidates
+NAME_SPLIT = re.compile(r'NAME', re.IGNORECASE)
+NAME_EXCLUDE = re.compile(r'(DAILY TIME RECORD|FORM|CSC|OFFICIAL HOURS|REGULA|MONTH)')
+NAME_IS_PERIOD = re.compile(r'^[A-Za-z]+\s+\d{1,2}[-–]\d{1,2},\s*\d{4}$')
+
+# Header fields
+MONTH_YEAR = re.compile(r'([A-Za-z]+),\s*(\d{4})')
+WORKING_HOURS = re.compile(
+    r'Regular\s+days\s+'
+    r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
+    r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s+and\s+'
+    r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
+    r'(\d{1,2}:\d{2})\s*([aApP][mM])?',
+    re.IGNORECASE
+)
+VERIFIED_BY = re.compile(r'\b(JUAN Z\. DELA CRUZ)\b', re.IGNORECASE)
+POSITION = re.compile(r'\b(Principal|Manager|Supervisor)\b', re.IGNORECASE)
+TOTAL_TIME = re.compile(r'\bTOTAL\s+(\d+\s+hours\s+and\s+\d+\s+minutes)\b', re.IGNORECASE)
+
+# Daily rows, including '11' being misread as 'u'
+DAILY_ROW = re.compile(
+    r'^([uU]|\d{1,2})\s+'
+    r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+    r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+    r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
+    r'(\d{1,2}:\d{2}\s*[APapmM]*)\s*'
+    r'(?:(\d+)\s*hrs?\s*(\d+)\s*mins?)?',
+    re.IGNORECASE
+)
+
+WHITESPACE = re.compile(r'\s+')
+POSITION_WORDS = ("PRINCIPAL", "MANAGER", "SUPERVISOR")
+
+NOT_FOUND = "Not found"
+
+
+def normalize(s):
+    return s.strip().replace("\n", " ") if s else NOT_FOUND
+
+
+def is_valid_name(candidate):
+    return bool(
+        candidate
+        and not NAME_EXCLUDE.search(candidate.upper())
+        and not NAME_IS_PERIOD.match(candidate)
+        and len(candidate.split()) >= 2
+        and not any(char.isdigit() for char in candidate)
+    )
+
+
+def format_time(t):
+    return WHITESPACE.sub('', t).upper()
+
+
+def format_working_hours(match):
+    morning_start = f"{match.group(1)} {match.group(2) or ''}".strip()
+    morning_end = f"{match.group(3)} {match.group(4) or ''}".strip()
+    afternoon_start = f"{match.group(5)} {match.group(6) or ''}".strip()
+    afternoon_end = f"{match.group(7)} {match.group(8) or ''}".strip()
+    return f"{morning_start} - {morning_end} and {afternoon_start} - {afternoon_end}"
+
+
+def parse_daily_row(match):
+    day_str = match.group(1).upper()
+    day = 11 if day_str == 'U' else int(day_str)
+    if day < 1 or day > 31:
+        return None
+    return {
+        "day": day,
+        "am_arrival": format_time(match.group(2)),
+        "am_departure": format_time(match.group(3)),
+        "pm_arrival": format_time(match.group(4)),
+        "pm_departure": format_time(match.group(5)),
+        "undertime_hours": int(match.group(6)) if match.group(6) else 0,
+        "undertime_minutes": int(match.group(7)) if match.group(7) else 0
+    }
+
+
+def split_sections(full_text):
+    return SECTION_SPLIT.split(full_text)
+
+
+def parse_section(dtr_text):
+    """
+    Parse one DTR section. Returns the parsed dict; "month" and "year" are None
+    when no period could be found.
+    """
+    lines = [line.strip() for line in dtr_text.splitlines() if line.strip()]
+
+    name = None
+    month_year = None
+    working = None
+    verified = None
+    position = None
+    total_time = None
+    daily_entries = []
+
+    for i, line in enumerate(lines):
+        first = line[0]
+
+        # Daily rows start with the day number (or a misread 'u')
+        if first.isdigit() or first in "uU":
+            match = DAILY_ROW.match(line)
+            if match:
+                entry = parse_daily_row(match)
+                if entry:
+                    daily_entries.append(entry)
+                continue
+
+        upper = line.upper()
+
+        if name is None and "NAME" in upper:
+            before = NAME_SPLIT.split(line)[0].strip()
+            if is_valid_name(before):
+                name = before
+            elif i > 0 and is_valid_name(lines[i - 1]):
+                name = lines[i - 1]
+            elif i + 1 < len(lines) and is_valid_name(lines[i + 1]):
+                name = lines[i + 1]
+
+        if month_year is None and "," in line:
+            month_year = MONTH_YEAR.search(line)
+
+        if working is None and "REGULAR" in upper:
+            working = WORKING_HOURS.search(line)
+
+        if verified is None and "JUAN" in upper:
+            verified = VERIFIED_BY.search(line)
+
+        if position is None and any(word in upper for word in POSITION_WORDS):
+            position = POSITION.search(line)
+
+        if total_time is None and "TOTAL" in upper:
+            total_time = TOTAL_TIME.search(line)
+
+    # Fields OCR may have wrapped onto two lines
+    if month_year is None:
+        month_year = MONTH_YEAR.search(dtr_text)
+    if working is None:
+        working = WORKING_HOURS.search(dtr_text)
+    if total_time is None:
+        total_time = TOTAL_TIME.search(dtr_text)
+
+    return {
+        "name": normalize(name or NOT_FOUND),
+        "month": month_year.group(1).strip().capitalize() if month_year else None,
+        "year": int(month_year.group(2).strip()) if month_year else None,
+        "workingHours": format_working_hours(working) if working else NOT_FOUND,
+        "verifiedBy": normalize(verified.group(1)) if verified else NOT_FOUND,
+        "position": normalize(position.group(1)) if position else NOT_FOUND,
+        "totalTime": normalize(total_time.group(1)) if total_time else NOT_FOUND,
+        "dailyRecords": daily_entries
+    }
+
+
+def parse_dtr_text(full_text):
+    return [parse_section(section) for section in split_sections(full_text)]
@@ -0,0 +1,68 @@
+"""
+Time-of-day parsing for DTR day rows.
+
+Times are handled as integer minutes after midnight. OCR gives us "8:05", "08:05",
+"8:05AM" and "1:00 PM" for the same kinds of values, and a year of DTRs only holds a
+few hundred distinct strings, so results are cached.
+"""
+import re
+from functools import lru_cache
+
+TIME_OF_DAY = re.compile(r'^(\d{1,2}):(\d{1,2})\s*(?:([AaPp])\.?\s*[Mm]\.?)?$')
+
+MINUTES_PER_DAY = 24 * 60
+
+TIME_FIELDS = ("am_arrival", "am_departure", "pm_arrival", "pm_departure")
+# dtr_days keeps the OCR'd string and its parsed value side by side
+MINUTE_COLUMNS = tuple(f"{field}_min" for field in TIME_FIELDS)
+
+
+@lru_cache(maxsize=4096)
+def parse_time(value):
+    """
+    Minutes after midnight for "H:MM", "HH:MM", "H:MM AM" or "H:MMPM".
+    Returns None for empty or unparseable values.
+    """
+    if not value:
+        return None
+    match = TIME_OF_DAY.match(value.strip())
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if minute > 59:
+        return None
+    meridiem = match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem in "Pp" else 0)
+    elif hour > 23:
+        return None
+    return hour * 60 + minute
+
+
+def entry_minutes(entry):
+    """
+    The four times of a dtr_days row as minutes, None where missing.
+    Uses the stored *_min columns when the row has them, otherwise parses the strings.
+    """
+    return [
+        entry.get(column) if entry.get(column) is not None else parse_time(entry.get(field))
+        for field, column in zip(TIME_FIELDS, MINUTE_COLUMNS)
+    ]
+
+
+def format_time(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def minutes_between(start, end):
+    # Wraps past midnight like timedelta.seconds did
+    return (end - start) % MINUTES_PER_DAY
+
+
+# Office schedule, parsed once
+AM_START = parse_time("08:00")
+AM_END = parse_time("12:00")
+PM_START = parse_time("13:00")
+PM_END = parse_time("17:00")
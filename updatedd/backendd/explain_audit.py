@@ -0,0 +1,204 @@
+"""
+EXPLAIN the hot endpoint and payroll queries and fail if any of them scans a whole table,
+or, for the per-request endpoint queries, walks a whole index or needs a filesort.
+
+Run it against a database with realistic volume, e.g. a copy of
+updatedd/DB/Dump20250525 padded with synthetic employees:
+
+    python explain_audit.py --seed 200 --months 24   # add employees, then audit
+    python explain_audit.py                          # audit only
+    python explain_audit.py --cleanup                # remove the synthetic employees
+
+Seeded users are named explain_audit_<n> and get a DTR (with day rows) and a payslip
+per month; deleting them cascades to everything seeded. Tables are ANALYZEd after
+seeding so the optimizer sees the volume. Exits 1 if any plan reads a base table
+with type ALL, or an endpoint query plan has type index or "Using filesort".
+"""
+import argparse
+import calendar
+import random
+import sys
+
+from db_pool import pool
+from db_utils import insert_rows
+import payroll_run
+import payroll_totals
+import payslip_summary
+import queries
+
+SEED_PREFIX = "explain_audit_"
+
+
+# (name, SQL, parameter names, hot): the statements main.py, payroll_run, payslip_summary
+# and payroll_totals run, imported from where they are defined so the audit always
+# EXPLAINs the SQL that is deployed. IN lists get a single sample value.
+QUERIES = [
+    ("user by username", queries.USER_BY_USERNAME, ("username",), True),
+    ("/api/user/profile user", queries.PROFILE_USER, ("username",), True),
+    ("/api/user/profile payroll", queries.PROFILE_PAYROLL, ("user_id",), True),
+    ("/api/user/profile bonuses", queries.PROFILE_BONUSES, ("user_id",), True),
+    ("/api/user/profile loans", queries.PROFILE_LOANS, ("period_index", "user_id"), True),
+    ("/payslip", queries.PAYSLIP_FOR_PERIOD, ("user_id", "year", "month_num"), True),
+    ("/payslip profile", queries.PAYSLIP_PROFILE, ("user_id",), True),
+    ("/payslip loan lines", queries.PAYSLIP_LOAN_LINES, ("payslip_id",), True),
+    ("/payslip bonuses", queries.PAYSLIP_BONUSES, ("payslip_id",), True),
+    ("/available-months", queries.AVAILABLE_MONTHS, ("user_id",), True),
+    ("payslip ETag validator", queries.USER_PAYSLIPS_VERSION, ("user_id",), True),
+    ("/payslip/latest", queries.LATEST_PAYSLIP, ("user_id",), True),
+    ("/api/records", queries.USER_RECORDS, ("user_id",), True),
+    ("/api/payslip/summary user", queries.SUMMARY_USER, ("username",), True),
+    ("/api/payslip/summary payslips", payslip_summary.SUMMARY_PAYSLIPS, ("user_id", "year", "month_num"), True),
+    ("/api/payslip/summary bonuses", payslip_summary.SUMMARY_BONUSES, ("payslip_id",), True),
+    ("/api/payslip/summary loan lines", payslip_summary.SUMMARY_LOAN_LINES, ("payslip_id",), True),
+    ("/api/reports/totals", payroll_totals.YEAR_TOTALS, ("user_id", "year"), True),
+    ("/compute_salary dtr", payroll_run.DTR_FOR_MONTH, ("user_id", "month_num"), True),
+    ("payroll run dtrs", payroll_run.PERIOD_DTRS + " ORDER BY id DESC", ("year", "month_num"), False),
+    ("payroll run attendance", payroll_run.PERIOD_ATTENDANCE, ("dtr_id",), False),
+    ("payroll run profiles", payroll_run.PERIOD_PROFILES, ("user_id",), False),
+    ("payroll run loans", payroll_run.PERIOD_LOANS, ("user_id", "year", "month_num"), False),
+    ("payroll run bonuses", payroll_run.PERIOD_BONUSES, ("user_id",), False),
+    ("payroll run previous payslips", payroll_run.PREVIOUS_PAYSLIPS, ("user_id", "year", "month_num"), False),
+    ("payroll run new payslip ids", payroll_run.NEW_PAYSLIP_IDS, ("dtr_id",), False),
+]
+
+
+class _InLists(dict):
+    # {user_ids}, {years}, ... become a single placeholder
+    def __missing__(self, key):
+        return "%s"
+
+
+def seed(connection, employees, months, year):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        first = cursor.fetchone()[0] + 1
+        insert_rows(cursor, "users", ("full_name", "email", "username", "password_hash"), [
+            (f"AUDIT EMPLOYEE {first + i}", f"{SEED_PREFIX}{first + i}@example.com", f"{SEED_PREFIX}{first + i}", "-")
+            for i in range(employees)
+        ])
+        cursor.execute("SELECT id FROM users WHERE username LIKE %s AND id >= %s", (SEED_PREFIX + "%", first))
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        periods = [(year - 1 - i // 12, calendar.month_name[12 - i % 12]) for i in range(months)]
+        insert_rows(cursor, "dtrs", ("user_id", "employee_name", "month", "year", "status"), [
+            (user_id, f"AUDIT EMPLOYEE {user_id}", month, period_year, "processed")
+            for user_id in user_ids for period_year, month in periods
+        ])
+        cursor.execute(
+            f"SELECT id, user_id, month, year FROM dtrs WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            user_ids
+        )
+        dtrs = cursor.fetchall()
+
+        rng = random.Random(48)
+        insert_rows(cursor, "dtr_days", (
+            "dtr_id", "day", "am_arrival", "am_departure", "pm_arrival", "pm_departure",
+            "am_arrival_min", "am_departure_min", "pm_arrival_min", "pm_departure_min"
+        ), [
+            (dtr_id, day, "8:00", "12:00", "13:00", "17:00", 480 + rng.randint(0, 15), 720, 780, 1020)
+            for dtr_id, _, _, _ in dtrs for day in range(1, 23)
+        ])
+        insert_rows(cursor, "payslips", (
+            "user_id", "dtr_id", "month", "year", "working_days", "days_present", "gross_income",
+            "bonuses", "total_deductions", "net_income", "loan_deduction"
+        ), [
+            (user_id, dtr_id, month, period_year, 22, 22, 30000, 0, 4000, 26000, 0)
+            for dtr_id, user_id, month, period_year in dtrs
+        ])
+
+        for table in ("users", "dtrs", "dtr_days", "payslips"):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        connection.commit()
+        print(f"Seeded {len(user_ids)} employees x {months} months")
+    finally:
+        cursor.close()
+
+
+def cleanup(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE username LIKE %s", (SEED_PREFIX + "%",))
+        connection.commit()
+        print(f"Removed {cursor.rowcount} seeded employees")
+    finally:
+        cursor.close()
+
+
+def sample_values(cursor):
+    """Parameter values taken from the newest payslip, so the plans see real keys."""
+    cursor.execute("""
+        SELECT p.id AS payslip_id, p.user_id, p.dtr_id, p.year, p.month, p.month_num, u.username,
+               p.year * 12 + p.month_num AS period_index
+        FROM payslips p JOIN users u ON u.id = p.user_id
+        ORDER BY p.id DESC LIMIT 1
+    """)
+    return cursor.fetchone()
+
+
+def problems(row, hot):
+    """What is wrong with one row of a plan; hot endpoints may not walk a whole index or sort either."""
+    if str(row["table"]).startswith("<"):
+        return []
+    found = []
+    if row["type"] == "ALL":
+        found.append("FULL SCAN")
+    if hot and row["type"] == "index":
+        found.append("INDEX SCAN")
+    if hot and "Using filesort" in (row.get("Extra") or ""):
+        found.append("FILESORT")
+    return found
+
+
+def audit(cursor, sample):
+    failures = []
+    for name, sql, params, hot in QUERIES:
+        cursor.execute("EXPLAIN " + sql.format_map(_InLists()), [sample[param] for param in params])
+        plan = cursor.fetchall()
+        found = sorted({problem for row in plan for problem in problems(row, hot)})
+        print(f"{', '.join(found) or 'ok':>9}  {name}")
+        for row in plan:
+            print(f"           {row['table']}: type={row['type']} key={row['key']} rows={row['rows']}"
+                  f"{' (' + row['Extra'] + ')' if row.get('Extra') else ''}")
+        if found:
+            failures.append(f"{name} ({', '.join(found)})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, metavar="EMPLOYEES",
+                        help="Add this many synthetic employees before auditing")
+    parser.add_argument("--months", type=int, default=24, help="Months of history per seeded employee")
+    parser.add_argument("--year", type=int, default=2025, help="Seeded history ends in December of the year before")
+    parser.add_argument("--cleanup", action="store_true", help="Remove seeded employees and exit")
+    args = parser.parse_args()
+
+    try:
+        with pool.connection() as connection:
+            if args.cleanup:
+                cleanup(connection)
+                return
+            if args.seed:
+                seed(connection, args.seed, args.months, args.year)
+
+            cursor = connection.cursor(dictionary=True)
+            try:
+                sample = sample_values(cursor)
+                if not sample:
+                    sys.exit("No payslips to take sample values from; load a dump or use --seed")
+                failures = audit(cursor, sample)
+            finally:
+                cursor.close()
+    finally:
+        pool.close_all()
+
+    if failures:
+        print(f"{len(failures)} of {len(QUERIES)} queries have a bad plan: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"All {len(QUERIES)} queries use an index without a filesort on the hot endpoints")
+
+
+if __name__ == "__main__":
+    main()
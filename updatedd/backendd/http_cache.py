@@ -0,0 +1,51 @@
+"""
+ETags and Cache-Control for the payslip read endpoints (/payslip, /payslip/latest,
+/available-months, /api/records).
+
+A payslip is written once with its bonus and loan lines; recomputing a month deletes
+it and inserts a new one. So a response is identified by the ids and updated_at of
+the payslips it shows, plus the few other values in it (name, pay rates). Each
+endpoint reads those with one small validator query (queries.USER_PAYSLIPS_VERSION
+for the lists) and answers 304 Not Modified when the client's If-None-Match still
+matches, skipping the line queries and the JSON. Browsers send If-None-Match on their own for responses that carry an ETag.
+"""
+import hashlib
+
+from fastapi import Response
+
+# Bump when a response body changes shape, so clients drop copies in the old format
+ETAG_VERSION = 1
+# Clients may keep a copy but have to revalidate it before every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts):
+    """A weak ETag: the response is derived from these values, not hashed byte for byte."""
+    digest = hashlib.sha1(repr((ETAG_VERSION,) + parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:24]}"'
+
+
+def _opaque(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque(tag) == _opaque(etag) for tag in if_none_match.split(","))
+
+
+def not_modified(request, response, etag):
+    """
+    Put etag and Cache-Control on response. Returns a 304 response to send instead
+    when the client already has this version, otherwise None.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    response.headers.update(headers)
+    if matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return None
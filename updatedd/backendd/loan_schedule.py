@@ -0,0 +1,63 @@
+"""
+Loan amortization schedules: one loan_schedule row per loan per month.
+
+A schedule is generated when a loan is added or its terms change (profile_lists) and
+payroll never changes it. A payroll run reads the installment and the balance after it from the
+period's row, so paying, reversing or re-running a period leaves loans untouched.
+
+Installments are amount / duration_months rounded to centavos; the last one takes
+the rounding difference so every schedule ends at a zero balance.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from db_utils import insert_rows
+import work_calendar
+
+SCHEDULE_COLUMNS = ("loan_id", "user_id", "year", "month_num", "payment", "balance_after")
+LOAN_COLUMNS = ("id", "user_id", "amount", "duration_months", "start_month", "start_year")
+CENTAVO = Decimal("0.01")
+
+
+def build_schedule(loan):
+    """
+    Schedule rows (tuples of SCHEDULE_COLUMNS) for one employee_loans row.
+    Returns [] for loans without a usable start, duration or amount.
+    """
+    try:
+        duration = int(loan["duration_months"] or 0)
+        month = work_calendar.month_number(loan["start_month"])
+        year = int(loan["start_year"])
+    except (TypeError, ValueError):
+        return []
+    amount = Decimal(str(loan["amount"] or 0)).quantize(CENTAVO)
+    if duration <= 0 or amount <= 0:
+        return []
+
+    installment = (amount / duration).quantize(CENTAVO, ROUND_HALF_UP)
+    rows, balance = [], amount
+    for i in range(duration):
+        payment = balance if i == duration - 1 else min(installment, balance)
+        balance -= payment
+        rows.append((loan["id"], loan["user_id"], year, month, payment, balance))
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+    return rows
+
+
+def save_schedules(cursor, loans):
+    """Replace the schedules of the given loans. Returns the rows written."""
+    if not loans:
+        return 0
+    loans = [loan if isinstance(loan, dict) else dict(zip(LOAN_COLUMNS, loan)) for loan in loans]
+    ids = [loan["id"] for loan in loans]
+    cursor.execute(f"DELETE FROM loan_schedule WHERE loan_id IN ({', '.join(['%s'] * len(ids))})", ids)
+    rows = [row for loan in loans for row in build_schedule(loan)]
+    return insert_rows(cursor, "loan_schedule", SCHEDULE_COLUMNS, rows) if rows else 0
+
+
+def backfill_schedules(cursor):
+    """Schedules for loans saved before loan_schedule existed."""
+    cursor.execute(f"""
+        SELECT {', '.join(LOAN_COLUMNS)} FROM employee_loans
+        WHERE id NOT IN (SELECT DISTINCT loan_id FROM loan_schedule)
+    """)
+    return save_schedules(cursor, cursor.fetchall())
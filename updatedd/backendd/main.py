@@ -1,26 +1,32 @@
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Body
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Body, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr, Field  
-from pdf2image import convert_from_bytes
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from PIL import Image
-from decimal import Decimal
+from pydantic import BaseModel, EmailStr
+from datetime import datetime
+from typing import Optional, List
 from calendar import month_name
-from collections import defaultdict
-import calendar
 import mysql.connector
 import bcrypt
 import traceback
-import pytesseract
-import io
-import re
-import json
 
-# Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-POPPLER_PATH = r"C:\poppler\poppler-24.08.0\Library\bin"
+from db_pool import pool, get_db, PoolTimeout
+from db_async import get_async_db, run_in_db_thread, run_pooled
+from dtr_ingest import ingest_dtr_text
+from dtr_bulk import ingest_bulk
+from migrations import apply_migrations
+from payroll_run import pay_employee, run_payroll
+from payroll_totals import OFFICE, year_totals
+from payslip_summary import build_summary, load_summary_rows
+from profile_lists import sync_bonuses, sync_loans
+import http_cache
+import ocr_cache
+import profile_cache
+import ocr_jobs
+import ocr_workers
+import queries
+import work_calendar
+from ocr_workers import OCRSaturated, ocr_document
 
 app = FastAPI()
 
@@ -33,14 +39,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MySQL configuration
-db_config = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",
-    "database": "payslip",
-}
-
 # Models
 class PayrollProfile(BaseModel):
     baseSalaryPerHour: float
@@ -86,6 +84,16 @@ class SalaryRequest(BaseModel):
     username: str
     month_str: str  
 
+class Holiday(BaseModel):
+    date: str
+    name: str
+
+class PayrollRunRequest(BaseModel):
+    month: str
+    year: int
+    include_processed: bool = False
+    dry_run: bool = False
+
 
 class DeductionItem(BaseModel):
     label: str
@@ -120,7 +128,7 @@ class RecordOut(BaseModel):
 # Database initialization (run this once)
 def initialize_database():
     try:
-        connection = mysql.connector.connect(**db_config)
+        connection = pool.acquire()
         cursor = connection.cursor()
 
         # Create tables if they don't exist
@@ -130,6 +138,7 @@ def initialize_database():
             user_id INT NOT NULL,
             employee_name VARCHAR(255) NOT NULL,
             month VARCHAR(100) NOT NULL,
+            year INT NOT NULL,
             working_hours VARCHAR(255),
             verified_by VARCHAR(255),
             position VARCHAR(255),
@@ -180,18 +189,64 @@ def initialize_database():
     except Exception as e:
         print(f"Error initializing database: {str(e)}")
     finally:
-        if connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
+        if 'connection' in locals():
+            pool.release(connection)
 
 
-# Call this function when the application starts
+def migrate_database():
+    # The endpoints need the migrated schema (month_num, updated_at, dtr_attendance,
+    # loan_schedule, ...): a failed or blocked migration stops startup instead of
+    # leaving them to fail one request at a time
+    with pool.connection() as connection:
+        apply_migrations(connection)
+        cursor = connection.cursor()
+        try:
+            work_calendar.load_holidays(cursor)
+        finally:
+            cursor.close()
+
+
+# Call these functions when the application starts
 initialize_database()
+migrate_database()
+
+# Connection pool metrics
+@app.get("/api/db/pool")
+def get_pool_metrics():
+    return pool.metrics()
+
+# OCR worker metrics
+@app.get("/api/ocr/workers")
+def get_ocr_metrics():
+    return ocr_workers.metrics()
+
+@app.get("/api/ocr/cache")
+def get_ocr_cache_metrics():
+    return ocr_cache.stats()
+
+@app.get("/api/profile/cache")
+def get_profile_cache_metrics():
+    return profile_cache.stats()
+
+@app.get("/api/ocr/jobs")
+def get_ocr_job_metrics():
+    return ocr_jobs.metrics()
+
+@app.on_event("startup")
+async def start_job_runners():
+    await ocr_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    await ocr_jobs.stop()
+    ocr_workers.shutdown()
+    pool.close_all()
 
 @app.post("/register")
-def register_user(user: UserProfile):
+def register_user(user: UserProfile, connection=Depends(get_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor()
 
         cursor.execute("SELECT id FROM users WHERE email = %s OR username = %s", (user.email, user.username))
@@ -218,20 +273,19 @@ def register_user(user: UserProfile):
         ))
 
         connection.commit()
+        profile_cache.invalidate(user.username)
         return {"message": "User registered successfully"}
     except Exception as err:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(err)}")
     finally:
-        if 'connection' in locals() and connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
 
 # Login endpoint
 @app.post("/login")
-def login(user: LoginData):
+def login(user: LoginData, connection=Depends(get_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         cursor.execute("""
@@ -263,24 +317,29 @@ def login(user: LoginData):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Login failed: {str(err)}")
     finally:
-        if 'connection' in locals() and connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
 
 #fetch profile      
 @app.get("/api/user/profile")
 def get_user_profile(username: str = Query(...)):
+    # A cache hit is answered without taking a database connection
+    profile = profile_cache.get(username)
+    if profile is None:
+        try:
+            with pool.connection() as connection:
+                profile = load_user_profile(connection, username)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        profile_cache.put(username, profile)
+    return {**profile, "status": "success", "timestamp": datetime.now().isoformat()}
+
+def load_user_profile(connection, username):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # Get basic user info
-        cursor.execute("""
-            SELECT id, full_name, username, email 
-            FROM users 
-            WHERE username = %s
-            LIMIT 1
-        """, (username,))
+        cursor.execute(queries.PROFILE_USER, (username,))
         user = cursor.fetchone()
         
         if not user:
@@ -298,65 +357,18 @@ def get_user_profile(username: str = Query(...)):
             "leaveCredits": 0.0
         }
         
-        cursor.execute("""
-            SELECT 
-                IFNULL(employment_type, %s) AS employment_type,
-                IFNULL(salary_grade, %s) AS salaryGrade,
-                IFNULL(base_monthly_salary, %s) AS baseMonthlySalary,
-                IFNULL(base_salary_hour, %s) AS baseSalaryPerHour,
-                IFNULL(gsis_deduction, %s) AS gsisDeduction,
-                IFNULL(philhealth_deduction, %s) AS philhealthDeduction,
-                IFNULL(tax_deduction, %s) AS taxDeduction,
-                IFNULL(leave_credits, %s) AS leaveCredits
-            FROM employee_profiles 
-            WHERE user_id = %s
-        """, (
-            payroll_defaults["employment_type"],
-            '12',  # default salaryGrade
-            0,     # default baseMonthlySalary
-            payroll_defaults["baseSalaryPerHour"],
-            payroll_defaults["gsisDeduction"],
-            payroll_defaults["philhealthDeduction"],
-            payroll_defaults["taxDeduction"],
-            payroll_defaults["leaveCredits"],
-            user_id
-        ))
+        cursor.execute(queries.PROFILE_PAYROLL, (user_id,))
         payroll = cursor.fetchone() or payroll_defaults
 
         # Get bonuses - ensure consistent structure
-        cursor.execute("""
-            SELECT 
-            id,
-            IFNULL(bonus_type, '') AS bonus_type,
-            IFNULL(bonus_name, '') AS bonus_name,
-            IFNULL(amount, 0) AS amount,
-            IFNULL(frequency, 'monthly') AS frequency,
-            DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS created_at
-        FROM employee_bonuses
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        """, (user_id,))
+        cursor.execute(queries.PROFILE_BONUSES, (user_id,))
         bonuses = cursor.fetchall()
 
         # Get loans - ensure consistent structure
-        cursor.execute("""
-              SELECT 
-                    id,
-                    IFNULL(loan_type, '') AS loan_type,
-                    IFNULL(loan_name, '') AS loan_name,
-                    IFNULL(amount, 0) AS amount,
-                    IFNULL(start_month, '') AS start_month,
-                    IFNULL(start_year, '') AS start_year,
-                    IFNULL(duration_months, 0) AS duration_months,
-                    CAST(IFNULL(balance, 0) AS DECIMAL(10,2)) AS balance,
-                    DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS created_at
-                FROM employee_loans
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-            """, (user_id,))
+        cursor.execute(queries.PROFILE_LOANS, (datetime.now().year * 12 + datetime.now().month, user_id))
         loans = cursor.fetchall()
 
-        return {
+        return jsonable_encoder({
             "user": {
                 "full_name": user["full_name"],
                 "username": user["username"],
@@ -364,10 +376,8 @@ def get_user_profile(username: str = Query(...)):
             },
             "payrollProfile": payroll,
             "bonuses": bonuses,
-            "loans": loans,
-            "status": "success",
-            "timestamp": datetime.now().isoformat()
-        }
+            "loans": loans
+        })
 
     except Exception as err:
         traceback.print_exc()
@@ -381,15 +391,13 @@ def get_user_profile(username: str = Query(...)):
         )
 
     finally:
-        if 'connection' in locals() and connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
 
 # PUT to update or insert payroll profile including leaveCredits
 @app.put("/api/user/profile")
-def update_user_profile(data: dict = Body(...)):
+def update_user_profile(data: dict = Body(...), connection=Depends(get_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor()
 
         # Get user_id
@@ -465,80 +473,57 @@ def update_user_profile(data: dict = Body(...)):
             cursor.execute("UPDATE users SET password_hash = %s WHERE username = %s", 
                            (hashed, data["username"]))
 
-        # Clear and insert bonuses
-        cursor.execute("DELETE FROM employee_bonuses WHERE user_id = %s", (user_id,))
-        bonuses = payroll.get("bonuses", [])
+        # Bonuses and loans: only what changed is written (see profile_lists)
+        bonuses = [
+            {
+                "id": bonus.get("id"),
+                "bonus_type": bonus.get("type", ""),
+                "bonus_name": bonus.get("name", ""),
+                "amount": float(bonus.get("amount", 0.0)),
+                "frequency": bonus.get("frequency", "yearly")
+            }
+            for bonus in payroll.get("bonuses", [])
+            if bonus.get("name") and bonus.get("amount") is not None
+        ]
         bonus_other = payroll.get("bonusOther", {})
-
-        for bonus in bonuses:
-            if bonus.get("name") and bonus.get("amount") is not None:
-                cursor.execute("""
-                    INSERT INTO employee_bonuses 
-                    (user_id, bonus_type, bonus_name, amount, frequency)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    user_id,
-                    bonus.get("type", ""),
-                    bonus.get("name", ""),
-                    float(bonus.get("amount", 0.0)),
-                    bonus.get("frequency", "yearly")
-                ))
-
         if bonus_other and bonus_other.get("name"):
-            cursor.execute("""
-                INSERT INTO employee_bonuses 
-                (user_id, bonus_type, bonus_name, amount, frequency)
-                VALUES (%s, 'other', %s, %s, %s)
-            """, (
-                user_id,
-                bonus_other.get("name"),
-                float(bonus_other.get("amount", 0.0)),
-                bonus_other.get("frequency", "yearly")
-            ))
-
-        # Clear and insert loans
-        cursor.execute("DELETE FROM employee_loans WHERE user_id = %s", (user_id,))
-        loans = payroll.get("loans", [])
+            bonuses.append({
+                "id": bonus_other.get("id"),
+                "bonus_type": "other",
+                "bonus_name": bonus_other.get("name"),
+                "amount": float(bonus_other.get("amount", 0.0)),
+                "frequency": bonus_other.get("frequency", "yearly")
+            })
+        sync_bonuses(cursor, user_id, bonuses)
+
+        loans = [
+            {
+                "id": loan.get("id"),
+                "loan_type": loan.get("type", ""),
+                "loan_name": loan.get("name", ""),
+                "amount": float(loan.get("amount", 0.0)),
+                "start_month": loan.get("startMonth", None),
+                "start_year": loan.get("startYear", None),
+                "duration_months": loan.get("durationMonths", 0)
+            }
+            for loan in payroll.get("loans", [])
+            if loan.get("name") and loan.get("amount") is not None
+        ]
         loan_other = payroll.get("loanOther", {})
-
-        for loan in loans:
-            if loan.get("name") and loan.get("amount") is not None:
-                loan_amount = float(loan.get("amount", 0.0))
-                cursor.execute("""
-                    INSERT INTO employee_loans (
-                        user_id, loan_type, loan_name, amount, 
-                        start_month, start_year, duration_months, balance
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    user_id,
-                    loan.get("type", ""),
-                    loan.get("name", ""),
-                    loan_amount,
-                    loan.get("startMonth", None),
-                    loan.get("startYear", None),
-                    loan.get("durationMonths", 0),
-                    loan_amount  # 👈 this sets the initial balance = amount
-                ))
-
         if loan_other and loan_other.get("name"):
-                loan_other_amount = float(loan_other.get("amount", 0.0))
-                cursor.execute("""
-                    INSERT INTO employee_loans (
-                        user_id, loan_type, loan_name, amount, 
-                        start_month, start_year, duration_months, balance
-                    )
-                    VALUES (%s, 'other', %s, %s, %s, %s, %s, %s)
-                """, (
-                    user_id,
-                    loan_other.get("name"),
-                    loan_other_amount,
-                    loan_other.get("startMonth", ""),
-                    loan_other.get("startYear", ""),
-                    loan_other.get("durationMonths", 0),
-                    loan_other_amount  # 👈 again, set balance = amount
-                ))
+            loans.append({
+                "id": loan_other.get("id"),
+                "loan_type": "other",
+                "loan_name": loan_other.get("name"),
+                "amount": float(loan_other.get("amount", 0.0)),
+                "start_month": loan_other.get("startMonth", ""),
+                "start_year": loan_other.get("startYear", ""),
+                "duration_months": loan_other.get("durationMonths", 0)
+            })
+        # New loans start at balance = amount; unchanged ones keep their balance and schedule
+        sync_loans(cursor, user_id, loans)
         connection.commit()
+        profile_cache.invalidate(data["username"])
         return {"message": "Profile updated successfully"}
 
     except Exception as e:
@@ -546,11 +531,25 @@ def update_user_profile(data: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
-        if 'connection' in locals() and connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
 
 
+# /ocr takes a pooled connection only around its queries, never across the OCR itself,
+# so slow uploads can't use up the pool
+def find_ocr_user(username):
+    with pool.connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(queries.USER_BY_USERNAME, (username,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+def ingest_ocr_text(user_id, full_name, full_text, replace_existing):
+    with pool.connection() as connection:
+        return ingest_dtr_text(connection, user_id, full_name, full_text, replace_existing)
+
 # OCR Endpoint (Updated)
 @app.post("/ocr")
 async def ocr(
@@ -559,13 +558,8 @@ async def ocr(
     replace_existing: bool = Form(False),
 ):
     try:
-        print(f"Processing DTR for user: {username}")
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
-
         # Get user info
-        cursor.execute("SELECT id, full_name FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        user = await run_pooled(find_ocr_user, username)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid user")
         
@@ -574,207 +568,15 @@ async def ocr(
 
         # Process file
         contents = await file.read()
-        images = convert_from_bytes(contents, poppler_path=POPPLER_PATH) if file.filename.lower().endswith(".pdf") \
-            else [Image.open(io.BytesIO(contents))]
-
-        full_text = "\n\n".join([pytesseract.image_to_string(img) for img in images])
-        dtr_sections = re.split(r'\n(?=DAILY TIME RECORD)', full_text, flags=re.IGNORECASE)
-
-        def normalize(s):
-            return s.strip().replace("\n", " ") if s else "Not found"
-
-        def is_valid_name(candidate):
-            return (
-                candidate
-                and not re.search(r'(DAILY TIME RECORD|FORM|CSC|OFFICIAL HOURS|REGULA|MONTH)', candidate.upper())
-                and not re.match(r'^[A-Za-z]+\s+\d{1,2}[-–]\d{1,2},\s*\d{4}$', candidate)
-                and len(candidate.split()) >= 2
-                and not any(char.isdigit() for char in candidate)
-            )
-
-        extracted_data = []
-        # Updated pattern to better handle day numbers (including '11' being misread as 'u')
-        daily_pattern = re.compile(
-            r'^([uU]|\d{1,2})\s+'  # Handles 'u' or 'U' which might be misread '11'
-            r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
-            r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
-            r'(\d{1,2}:\d{2}\s*[APapmM]*)\s+'
-            r'(\d{1,2}:\d{2}\s*[APapmM]*)\s*'
-            r'(?:(\d+)\s*hrs?\s*(\d+)\s*mins?)?',
-            re.MULTILINE | re.IGNORECASE
-        )
-
-        for dtr_text in dtr_sections:
-            lines = [line.strip() for line in dtr_text.splitlines() if line.strip()]
-
-            # Extract name
-            name = "Not found"
-            for i, line in enumerate(lines):
-                if "NAME" in line.upper():
-                    parts = re.split(r'NAME', line, flags=re.IGNORECASE)
-                    if len(parts) > 1 and is_valid_name(parts[0].strip()):
-                        name = parts[0].strip()
-                        break
-                    elif i > 0 and is_valid_name(lines[i - 1]):
-                        name = lines[i - 1]
-                        break
-                    elif i + 1 < len(lines) and is_valid_name(lines[i + 1]):
-                        name = lines[i + 1]
-                        break
-
-            if full_name not in name.upper():
-                raise HTTPException(status_code=403, detail=f"DTR belongs to {name}, not the logged-in user.")
-
-            # Extract month
-            month_year_match = re.search(r'([A-Za-z]+),\s*(\d{4})', dtr_text)
-            if not month_year_match:
-                raise HTTPException(status_code=400, detail="Could not extract month and year from DTR")
-
-            parsed_month = month_year_match.group(1).strip().capitalize()
-            parsed_year = int(month_year_match.group(2).strip())
-
-            # Check existing DTR and delete if replacing
-            cursor.execute("""
-                SELECT id FROM dtrs WHERE user_id = %s AND LOWER(month) = LOWER(%s) AND year = %s
-            """, (user_id, parsed_month.lower(), parsed_year))
-            existing_dtr = cursor.fetchone()
-
-            if existing_dtr and not replace_existing:
-                raise HTTPException(
-                    status_code=409,
-                    detail=f"You already uploaded a DTR for {parsed_month}. Set 'replace_existing' to true to replace it."
-                )
-            elif existing_dtr and replace_existing:
-                # Delete existing daily records first
-                cursor.execute("DELETE FROM dtr_days WHERE dtr_id = %s", (existing_dtr["id"],))
-                # Then delete the DTR header
-                cursor.execute("DELETE FROM dtrs WHERE id = %s", (existing_dtr["id"],))
-                connection.commit()
-                print(f"Deleted existing DTR {existing_dtr['id']} and its daily records for replacement")
-
-            # Extract working hours
-            working_hours = "Not found"
-            working_match = re.search(
-                r'Regular\s+days\s+'
-                r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
-                r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s+and\s+'
-                r'(\d{1,2}:\d{2})\s*([aApP][mM])?\s*[–\-]\s*'
-                r'(\d{1,2}:\d{2})\s*([aApP][mM])?',
-                dtr_text,
-                re.IGNORECASE
-            )
-            if working_match:
-                morning_start = f"{working_match.group(1)} {working_match.group(2) or ''}".strip()
-                morning_end = f"{working_match.group(3)} {working_match.group(4) or ''}".strip()
-                afternoon_start = f"{working_match.group(5)} {working_match.group(6) or ''}".strip()
-                afternoon_end = f"{working_match.group(7)} {working_match.group(8) or ''}".strip()
-                working_hours = f"{morning_start} - {morning_end} and {afternoon_start} - {afternoon_end}"
-
-            # Extract other fields
-            verified_match = re.search(r'\b(JUAN Z\. DELA CRUZ)\b', dtr_text, re.IGNORECASE)
-            position_match = re.search(r'\b(Principal|Manager|Supervisor)\b', dtr_text, re.IGNORECASE)
-            total_time_match = re.search(r'\bTOTAL\s+(\d+\s+hours\s+and\s+\d+\s+minutes)\b', dtr_text, re.IGNORECASE)
-
-            parsed = {
-                "name": normalize(name),
-                "month": parsed_month,
-                "year": parsed_year,
-                "workingHours": normalize(working_hours),
-                "verifiedBy": normalize(verified_match.group(1)) if verified_match else "Not found",
-                "position": normalize(position_match.group(1)) if position_match else "Not found",
-                "totalTime": normalize(total_time_match.group(1)) if total_time_match else "Not found",
-                "dailyRecords": []
-            }
+        try:
+            page_texts = await ocr_document(contents, file.filename)
+        except OCRSaturated as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
 
-            # Insert DTR header
-            cursor.execute("""
-                INSERT INTO dtrs (user_id, employee_name, month, year, working_hours, verified_by, position, total_time)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                user_id, parsed["name"], parsed["month"], parsed["year"], parsed["workingHours"],
-                parsed["verifiedBy"], parsed["position"], parsed["totalTime"]
-            ))
-            
-            # Get inserted DTR ID
-            cursor.execute("SELECT LAST_INSERT_ID() AS dtr_id")
-            dtr_id = cursor.fetchone()["dtr_id"]
-            print(f"Inserted DTR ID: {dtr_id}")
-
-            # Process daily entries with improved validation
-            daily_entries = []
-            insert_values = []
-            for match in daily_pattern.finditer(dtr_text):
-                try:
-                    day_str = match.group(1).upper()  # Convert to uppercase for 'U' check
-                    
-                    # Handle 'u' being misread as '11'
-                    if day_str == 'U':
-                        day = 11
-                    else:
-                        if not day_str.isdigit():
-                            print(f"Skipping invalid day: {day_str}")
-                            continue
-                        day = int(day_str)
-                    
-                    if day < 1 or day > 31:
-                        continue
-
-                    # Normalize time format
-                    def format_time(t):
-                        t = re.sub(r'\s+', '', t).upper()
-                        if not re.search(r'[AP]M$', t):
-                            hour_part = t.split(':')[0]
-                            if hour_part.isdigit():
-                                hour = int(hour_part)
-                                period = '' if hour < 12 else ''
-                                return f"{t}{period}"
-                        return t
-
-                    am_arrival = format_time(match.group(2))
-                    am_departure = format_time(match.group(3))
-                    pm_arrival = format_time(match.group(4))
-                    pm_departure = format_time(match.group(5))
-                    
-                    undertime_hours = int(match.group(6)) if match.group(6) else 0
-                    undertime_minutes = int(match.group(7)) if match.group(7) else 0
-
-                    daily_entries.append({
-                        "day": day,
-                        "am_arrival": am_arrival,
-                        "am_departure": am_departure,
-                        "pm_arrival": pm_arrival,
-                        "pm_departure": pm_departure,
-                        "undertime_hours": undertime_hours,
-                        "undertime_minutes": undertime_minutes
-                    })
-
-                    insert_values.append((
-                        dtr_id,
-                        day,
-                        am_arrival,
-                        am_departure,
-                        pm_arrival,
-                        pm_departure,
-                        undertime_hours,
-                        undertime_minutes
-                    ))
-
-                except Exception as e:
-                    print(f"Error processing day entry: {str(e)}")
-                    continue
-
-            # Batch insert daily entries
-            if insert_values:
-                cursor.executemany("""
-                    INSERT INTO dtr_days 
-                    (dtr_id, day, am_arrival, am_departure, pm_arrival, pm_departure, undertime_hours, undertime_minutes)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, insert_values)
-                print(f"Inserted {len(insert_values)} daily records for DTR {dtr_id}")
-
-            connection.commit()
-            parsed["dailyRecords"] = daily_entries
-            extracted_data.append(parsed)
+        full_text = "\n\n".join(page_texts)
+        extracted_data = await run_pooled(
+            ingest_ocr_text, user_id, full_name, full_text, replace_existing
+        )
 
         return JSONResponse({
             "text": full_text,
@@ -786,312 +588,176 @@ async def ocr(
             }
         })
 
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except mysql.connector.Error as err:
+        # ingest_dtr_text has already rolled back
         print(f"Database error: {err}")
-        if 'connection' in locals() and connection.is_connected():
-            connection.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err.msg}")
     except HTTPException:
         raise
     except Exception as err:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(err)}")
-    finally:
-        if 'connection' in locals() and connection.is_connected():
-            cursor.close()
-            connection.close()
 
-#computation of salary
-def clamp_time(actual_str, expected_str, direction="in"):
-    actual = datetime.strptime(actual_str, "%H:%M").time()
-    expected = datetime.strptime(expected_str, "%H:%M").time()
-    return max(actual, expected) if direction == "in" else min(actual, expected)
+# Bulk DTR upload (many files or ZIP archives, matched to users by DTR name)
+@app.post("/ocr/bulk")
+async def ocr_bulk(
+    files: List[UploadFile] = File(...),
+    replace_existing: bool = Form(False),
+):
+    try:
+        uploads = [(f.filename, await f.read()) for f in files]
+        return await ingest_bulk(uploads, replace_existing)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as err:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Bulk upload failed: {str(err)}")
 
-def minutes_between(t1, t2):
-    return (datetime.combine(datetime.today(), t2) - datetime.combine(datetime.today(), t1)).seconds / 60
+# Background OCR jobs
+@app.post("/ocr/jobs", status_code=202)
+async def submit_ocr_job(
+    file: UploadFile = File(...),
+    username: str = Form(...),
+    replace_existing: bool = Form(False),
+    connection=Depends(get_async_db),
+):
+    cursor = connection.cursor(dictionary=True)
+    try:
+        await cursor.execute(queries.USER_BY_USERNAME, (username,))
+        user = await cursor.fetchone()
+    finally:
+        await cursor.close()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid user")
 
-def compute_daily_hours(entry):
+    contents = await file.read()
     try:
-        am_minutes, pm_minutes = 0, 0
-
-        if entry["am_arrival"] and entry["am_departure"]:
-            am_arrival = clamp_time(entry["am_arrival"], "08:00", "in")
-            am_departure = clamp_time(entry["am_departure"], "12:00", "out")
-            am_minutes = max(minutes_between(am_arrival, am_departure), 0)
-
-        if entry["pm_arrival"] and entry["pm_departure"]:
-            pm_arrival = clamp_time(entry["pm_arrival"], "13:00", "in")
-            pm_departure = clamp_time(entry["pm_departure"], "17:00", "out")
-            pm_minutes = max(minutes_between(pm_arrival, pm_departure), 0)
-
-        undertime = (entry.get("undertime_hours", 0) * 60) + entry.get("undertime_minutes", 0)
-        return max((am_minutes + pm_minutes - undertime) / 60, 0)
-    except:
-        return 0
-    
+        job = ocr_jobs.submit(
+            user["id"], user["full_name"].strip().upper(), username,
+            file.filename, contents, replace_existing
+        )
+    except ocr_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/ocr/jobs/{job['id']}"
+    }
+
+@app.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str):
+    job = ocr_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+#computation of salary
 @app.post("/compute_salary")
-async def compute_salary(payload: SalaryRequest):
+async def compute_salary(payload: SalaryRequest, connection=Depends(get_async_db)):
     try:
-        print(f"⏩ Received payload: {payload.dict()}")
-        
         username = payload.username
         month_str = payload.month_str.strip().capitalize()
 
-        # Database connection
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
-        
-        # 1. Get user ID
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        user_id = user["id"]
-        
-        # 2. Get DTR
-        cursor.execute("""
-            SELECT * FROM dtrs 
-            WHERE user_id = %s 
-            AND month = %s
-            LIMIT 1
-        """, (user_id, month_str))
-        dtr = cursor.fetchone()
-        if not dtr:
-            raise HTTPException(status_code=404, detail=f"No DTR found for {month_str}")
-
-        dtr_month = dtr["month"]
-        dtr_year = dtr["year"]
-
-        # 3. Calculate working days
-        try:
-            month_index = list(calendar.month_name).index(dtr_month)
-            _, num_days = calendar.monthrange(dtr_year, month_index)
-            working_days = sum(
-                1 for day in range(1, num_days + 1)
-                if datetime(dtr_year, month_index, day).weekday() < 5
-            )
-        except:
-            working_days = 22  # Fallback value
-
-        # 4. Get daily entries and compute hours
-        cursor.execute("SELECT * FROM dtr_days WHERE dtr_id = %s", (dtr["id"],))
-        day_entries = cursor.fetchall()
-        
-        def compute_daily_hours(e):
-            try:
-                times = [
-                    datetime.strptime(e[period], "%H:%M") 
-                    for period in ['am_arrival', 'am_departure', 'pm_arrival', 'pm_departure']
-                    if e.get(period)
-                ]
-                if len(times) != 4:
-                    return 0.0
-                return (times[1] - times[0] + times[3] - times[2]).seconds / 3600
-            except:
-                return 0.0
-
-        total_hours = sum(compute_daily_hours(e) for e in day_entries)
-        days_present = sum(1 for e in day_entries if e.get("am_arrival") and e.get("pm_arrival"))
-
-        # 5. Get payroll profile with proper error handling
-        cursor.execute("""
-            SELECT base_salary_hour, employment_type, leave_credits,
-                   gsis_deduction, philhealth_deduction, tax_deduction,
-                   base_monthly_salary
-            FROM employee_profiles WHERE user_id = %s
-        """, (user_id,))
-        profile = cursor.fetchone()
-        if not profile:
-            raise HTTPException(status_code=404, detail="Payroll profile not found")
-
-                # Convert all values to float with error handling
-        try:
-                    rate = float(profile["base_salary_hour"])
-                    monthly_salary = float(profile["base_monthly_salary"])
-                    employment_type = profile["employment_type"]
-                    leave_credits = float(profile["leave_credits"] or 0)
-                    philhealth = float(profile["philhealth_deduction"] or 0)
-                    tax = float(profile["tax_deduction"] or 0)
-                    gsis = float(profile["gsis_deduction"] or 0)
-        except (TypeError, ValueError) as e:
-            raise HTTPException(status_code=500, detail=f"Invalid payroll values: {str(e)}")
-
-        if employment_type == "irregular":
-            gross = total_hours * rate
-            days_absent = 0
-            leave_used = 0
-        else:
-            gross = monthly_salary
-            days_absent = max(working_days - days_present, 0)
-            leave_used = min(leave_credits, days_absent)
-            unpaid_absent_days = max(days_absent - leave_used, 0)
-            absent_deduction = round((monthly_salary / working_days) * unpaid_absent_days, 2)
-            gross = monthly_salary - absent_deduction
-            new_leave_credits = leave_credits - leave_used
-            cursor.execute(
-                "UPDATE employee_profiles SET leave_credits = %s WHERE user_id = %s",
-                (new_leave_credits, user_id)
-            )
-
-        # 7. Process Loans - NOW AT CORRECT INDENTATION LEVEL
-        loan_deduction = 0.0
-        loans_to_save = []
-
-        try:
-            print("\n🔎 Checking loans for deduction...")
-            cursor.execute("""
-                SELECT id, loan_name, amount, duration_months, 
-                    start_month, start_year, balance
-                FROM employee_loans 
-                WHERE user_id = %s AND balance >= 0
-            """, (user_id,))
-            loans = cursor.fetchall()
-            
-            current_period = f"{dtr_month} {dtr_year}"
-            
-            for loan in loans:
-                try:
-                    # Handle month format (both "01" and "January")
-                    if loan['start_month'].isdigit():
-                        month_num = int(loan['start_month'])
-                        start_month = calendar.month_name[month_num]
-                    else:
-                        start_month = loan['start_month'].capitalize()
-                    
-                    loan_date = datetime.strptime(f"{start_month} {loan['start_year']}", "%B %Y")
-                    current_date = datetime.strptime(current_period, "%B %Y")
-                    
-                    if current_date >= loan_date:
-                        monthly_payment = round(float(loan['amount']) / loan['duration_months'], 2)
-                        if monthly_payment > float(loan['balance']):
-                            monthly_payment = float(loan['balance'])
-                        
-                        loan_deduction += monthly_payment
-                        new_balance = round(float(loan['balance']) - monthly_payment, 2)
-                        
-                        loans_to_save.append({
-                            'loan_name': loan['loan_name'],
-                            'amount': monthly_payment
-                        })
-                        
-                        cursor.execute(
-                            "UPDATE employee_loans SET balance = %s WHERE id = %s",
-                            (new_balance, loan['id'])
-                        )
-                except Exception as e:
-                    print(f"Error processing loan {loan.get('id')}: {str(e)}")
-                    continue
-
-        except Exception as e:
-            print(f"Loan processing failed: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Loan processing error: {str(e)}")
-                    
-        # 8. Process Bonuses - Updated to match your schema
-        bonuses = 0.0
-        bonuses_to_save = []
-
-        cursor.execute("""
-            SELECT amount, frequency, bonus_type, bonus_name 
-            FROM employee_bonuses 
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        bonuses_data = cursor.fetchall()
-        for b in bonuses_data:
-            try:
-                # Monthly bonuses always apply
-                if b["frequency"] == "monthly":
-                    bonuses += float(b["amount"])
-                    bonuses_to_save.append({
-                        'bonus_name': b["bonus_name"],  # Using bonus_name instead of bonus_type
-                        'amount': float(b["amount"])
-                    })
-                # Yearly bonuses only in December
-                elif b["frequency"] == "yearly" and dtr_month.lower() == "december":
-                    bonuses += float(b["amount"])
-                    bonuses_to_save.append({
-                        'bonus_name': b["bonus_name"],  # Using bonus_name instead of bonus_type
-                        'amount': float(b["amount"])
-                    })
-            except Exception as e:
-                print(f"⚠️ Error processing bonus: {str(e)}")
-                continue
-
-
-        # 9. Final calculations
-        total_deductions = round(gsis + philhealth + tax + loan_deduction, 2)
-        net = round(gross + bonuses - total_deductions, 2)
-
-        # 10. Save payslip
-        cursor.execute("""
-            INSERT INTO payslips (
-                user_id, dtr_id, month, year,
-                working_days, days_present, days_absent, leave_used,
-                total_hours, gross_income, bonuses,
-                philhealth_deduction, tax_deduction, loan_deduction,
-                total_deductions, net_income, created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """, (
-            user_id, dtr["id"], dtr_month, dtr_year,
-            working_days, days_present, days_absent, leave_used,
-            round(total_hours, 2), round(gross, 2), round(bonuses, 2),
-            philhealth, tax, round(loan_deduction, 2),
-            total_deductions, net
-        ))
-        
-        payslip_id = cursor.lastrowid
-
-        # 11. Save loan deductions to payslip_loan_deductions
-        for loan in loans_to_save:
-            cursor.execute("""
-                INSERT INTO payslip_loan_deductions 
-                (payslip_id, loan_name, amount)
-                VALUES (%s, %s, %s)
-            """, (payslip_id, loan['loan_name'], loan['amount']))
-
-        # 12. Save bonuses to payslip_bonuses
-        for bonus in bonuses_to_save:
-            cursor.execute("""
-                INSERT INTO payslip_bonuses 
-                (payslip_id, bonus_name, amount)
-                VALUES (%s, %s, %s)
-            """, (payslip_id, bonus['bonus_name'], bonus['amount']))
-
-        # 11. Update DTR status
-        cursor.execute("""
-            UPDATE dtrs SET status = 'processed', processed_at = NOW()
-            WHERE id = %s
-        """, (dtr["id"],))
-
-        connection.commit()
+        # Paying the same inputs twice returns the stored payslip instead of deducting again
+        payslip, recomputed = await run_in_db_thread(pay_employee, connection.raw, username, month_str)
+        # Paying uses up leave credits
+        profile_cache.invalidate(username)
 
         return {
             "status": "success",
+            "recomputed": recomputed,
             "data": {
-                "employee": dtr["employee_name"],
-                "period": f"{dtr_month} {dtr_year}",
-                "grossIncome": round(gross, 2),
+                "employee": payslip["employee_name"],
+                "period": f"{payslip['month']} {payslip['year']}",
+                "grossIncome": round(float(payslip["gross_income"]), 2),
                 "deductions": {
-                    "philhealth": philhealth,
-                    "tax": tax,
-                    "loans": round(loan_deduction, 2),
-                    "total": total_deductions
+                    "philhealth": float(payslip["philhealth_deduction"]),
+                    "tax": float(payslip["tax_deduction"]),
+                    "loans": round(float(payslip["loan_deduction"]), 2),
+                    "total": float(payslip["total_deductions"])
                 },
-                "netPay": net
+                "netPay": float(payslip["net_income"])
             }
         }
 
     except HTTPException:
         raise
     except Exception as e:
-        connection.rollback()
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/payroll/run")
+async def payroll_run(payload: PayrollRunRequest):
+    try:
+        result = await run_pooled(
+            run_payroll, payload.month, payload.year, payload.include_processed, payload.dry_run
+        )
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except mysql.connector.Error as err:
+        print(f"Payroll run failed: {err}")
+        raise HTTPException(status_code=500, detail=f"Database error: {err.msg}")
+    if not payload.dry_run:
+        # Leave credits changed for everyone paid
+        profile_cache.clear()
+    return result
+
+
+@app.get("/api/calendar/{year}")
+def get_work_calendar(year: int):
+    return {
+        "year": year,
+        "weekend": sorted(work_calendar.PAYROLL_WEEKEND),
+        "months": {
+            month_name[month]: info for month, info in work_calendar.year_table(year).items()
+        }
+    }
+
+@app.post("/api/calendar/holidays")
+def save_holiday(holiday: Holiday, connection=Depends(get_db)):
+    try:
+        holiday_date = datetime.strptime(holiday.date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Holiday date must be YYYY-MM-DD")
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO holidays (holiday_date, name) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE name = VALUES(name)
+        """, (holiday_date, holiday.name))
+        connection.commit()
+        work_calendar.load_holidays(cursor)
+        return {"message": "Holiday saved", "date": holiday_date.isoformat(), "name": holiday.name}
+    except mysql.connector.Error as err:
+        connection.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {err.msg}")
     finally:
-        if connection.is_connected():
+        if 'cursor' in locals():
             cursor.close()
-            connection.close()
 
+@app.delete("/api/calendar/holidays/{holiday_date}")
+def delete_holiday(holiday_date: str, connection=Depends(get_db)):
+    try:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM holidays WHERE holiday_date = %s", (holiday_date,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Holiday not found")
+        connection.commit()
+        work_calendar.load_holidays(cursor)
+        return {"message": "Holiday deleted"}
+    except mysql.connector.Error as err:
+        connection.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {err.msg}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
 
 #fetching payslips
 def format_month_for_db(month_str: str) -> tuple:
@@ -1133,80 +799,67 @@ def parse_db_month_to_iso(month: str, year: int) -> str:
 
 
 @app.get("/payslip")
-async def get_payslip(username: str, month: str, year: int):
-    print(f"🔍 Fetching payslip for {username}, input month: {month}, input year: {year}")
-
+async def get_payslip(request: Request, response: Response, username: str, month: str, year: int,
+                      connection=Depends(get_async_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # 🔎 Get user ID & full name
-        cursor.execute("SELECT id, full_name FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        await cursor.execute(queries.USER_BY_USERNAME, (username,))
+        user = await cursor.fetchone()
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         user_id = user["id"]
         full_name = user["full_name"]
-        print(f"✅ Found user ID: {user_id}, Name: {full_name}")
 
         # 📅 Normalize month format
         parsed_month, parsed_year = format_month_for_db(month)
         normalized_month = parsed_month.strip().lower().capitalize() if parsed_month else month.strip().lower().capitalize()
         normalized_year = parsed_year if parsed_year != 0 else year
-        print(f"📅 Normalized month: {normalized_month}, year: {normalized_year}")
+
+        try:
+            month_num = work_calendar.month_number(normalized_month)
+        except ValueError:
+            raise HTTPException(status_code=404, detail=f"No payslip found for {normalized_month} {normalized_year}")
 
         # 📄 Fetch payslip from DB
-        cursor.execute("""
-            SELECT *
-            FROM payslips
-            WHERE user_id = %s AND LOWER(TRIM(month)) = %s AND year = %s
-            ORDER BY created_at DESC
-            LIMIT 1
-        """, (user_id, normalized_month.lower(), normalized_year))
-
-        payslip = cursor.fetchone()
+        await cursor.execute(queries.PAYSLIP_FOR_PERIOD, (user_id, normalized_year, month_num))
+
+        payslip = await cursor.fetchone()
         if not payslip:
             raise HTTPException(status_code=404, detail=f"No payslip found for {normalized_month} {normalized_year}")
         
         payslip_id = payslip["id"]
-        print(f"📄 Found payslip ID: {payslip_id}")
 
         # 👔 Get employee profile
-        cursor.execute("""
-            SELECT employment_type, base_salary_hour, base_monthly_salary, salary_grade
-            FROM employee_profiles
-            WHERE user_id = %s
-        """, (user_id,))
-        profile = cursor.fetchone()
+        await cursor.execute(queries.PAYSLIP_PROFILE, (user_id,))
+        profile = await cursor.fetchone()
 
         employment_type = profile.get("employment_type", "irregular") if profile else "irregular"
         rate_per_hour = float(profile.get("base_salary_hour", 0)) if employment_type == "irregular" else None
         rate_per_month = float(profile.get("base_monthly_salary", 0)) if employment_type == "regular" else None
 
+        # 🏷️ Same payslip and profile as the client's copy: skip the lines and the JSON
+        etag = http_cache.make_etag(
+            "payslip", full_name, normalized_month, normalized_year, payslip_id, payslip["updated_at"],
+            *(profile.values() if profile else ())
+        )
+        unchanged = http_cache.not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
         # 🎁 Get bonuses
-        cursor.execute("""
-            SELECT bonus_name, amount
-            FROM payslip_bonuses
-            WHERE payslip_id = %s
-        """, (payslip_id,))
-        bonuses = [{"label": b["bonus_name"], "amount": float(b["amount"])} for b in cursor.fetchall()]
+        await cursor.execute(queries.PAYSLIP_BONUSES, (payslip_id,))
+        bonuses = [{"label": b["bonus_name"], "amount": float(b["amount"])} for b in await cursor.fetchall()]
 
         # 💸 Get loan deductions
-        cursor.execute("""
-            SELECT 
-                pl.loan_name, 
-                pl.amount,
-                (SELECT balance FROM employee_loans 
-                WHERE user_id = %s AND loan_name = pl.loan_name
-                ORDER BY created_at DESC LIMIT 1) as balance
-            FROM payslip_loan_deductions pl
-            WHERE pl.payslip_id = %s
-        """, (user_id, payslip_id))
+        # Balance as of this payslip, stored when it was computed
+        await cursor.execute(queries.PAYSLIP_LOAN_LINES, (payslip_id,))
         
         loan_deductions = []
-        for l in cursor.fetchall():
+        for l in await cursor.fetchall():
             loan_deductions.append({
                 "label": l["loan_name"],
                 "amount": float(l["amount"]),
@@ -1220,7 +873,7 @@ async def get_payslip(username: str, month: str, year: int):
             {"label": "Tax", "amount": float(payslip.get("tax_deduction", 0))},
         ] + loan_deductions
 
-        response = {
+        body = {
             "fullName": full_name,
             "period": parse_db_month_to_iso(normalized_month, normalized_year),
             "employmentType": employment_type,
@@ -1239,8 +892,7 @@ async def get_payslip(username: str, month: str, year: int):
             "leaveUsed": payslip.get("leave_used", 0),
         }
 
-        print(f"📤 Final response: {response}")
-        return response
+        return body
 
     except mysql.connector.Error as err:
         print(f"❌ MySQL error: {err}")
@@ -1251,76 +903,72 @@ async def get_payslip(username: str, month: str, year: int):
         raise HTTPException(status_code=500, detail=f"Error fetching payslip: {str(e)}")
     finally:
         if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
-            connection.close()
+            await cursor.close()
 
 
 @app.get("/available-months")
-async def get_available_months(username: str):
+async def get_available_months(request: Request, response: Response, username: str,
+                               connection=Depends(get_async_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # Get user ID
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        await cursor.execute(queries.USER_BY_USERNAME, (username,))
+        user = await cursor.fetchone()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        await cursor.execute(queries.USER_PAYSLIPS_VERSION, (user['id'],))
+        etag = http_cache.make_etag("available-months", *(await cursor.fetchone()).values())
+        unchanged = http_cache.not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
         # Get distinct month+year pairs
-        cursor.execute("""
-            SELECT DISTINCT TRIM(month) as month, year
-            FROM payslips 
-            WHERE user_id = %s
-            ORDER BY year DESC, 
-                     STR_TO_DATE(CONCAT('01 ', month), '%d %M') DESC
-        """, (user['id'],))
+        await cursor.execute(queries.AVAILABLE_MONTHS, (user['id'],))
         
-        results = cursor.fetchall()
+        results = await cursor.fetchall()
         return [{"month": row["month"], "year": row["year"]} for row in results]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if 'connection' in locals() and connection.is_connected():
-            cursor.close()
-            connection.close()
+        if 'cursor' in locals():
+            await cursor.close()
 
 @app.get("/payslip/latest")
-async def get_latest_payslip(username: str):
+async def get_latest_payslip(request: Request, response: Response, username: str,
+                             connection=Depends(get_async_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # Make sure to fetch both id and full_name
-        cursor.execute("SELECT id, full_name FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        await cursor.execute(queries.USER_BY_USERNAME, (username,))
+        user = await cursor.fetchone()
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         user_id = user["id"]
 
-        cursor.execute("""
-            SELECT * FROM payslips
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-            LIMIT 1
-        """, (user_id,))
-        payslip = cursor.fetchone()
+        await cursor.execute(queries.LATEST_PAYSLIP, (user_id,))
+        payslip = await cursor.fetchone()
         if not payslip:
             raise HTTPException(status_code=404, detail="No payslip found")
 
         payslip_id = payslip["id"]
+        etag = http_cache.make_etag("payslip/latest", user["full_name"], payslip_id, payslip["updated_at"])
+        unchanged = http_cache.not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
 
         # Bonuses
-        cursor.execute("SELECT bonus_name, amount FROM payslip_bonuses WHERE payslip_id = %s", (payslip_id,))
-        bonuses = [{"label": row["bonus_name"], "amount": float(row["amount"])} for row in cursor.fetchall()]
+        await cursor.execute(queries.PAYSLIP_BONUSES, (payslip_id,))
+        bonuses = [{"label": row["bonus_name"], "amount": float(row["amount"])} for row in await cursor.fetchall()]
 
         # Loans
-        cursor.execute("SELECT loan_name, amount FROM payslip_loan_deductions WHERE payslip_id = %s", (payslip_id,))
-        loans = [{"label": row["loan_name"], "amount": float(row["amount"])} for row in cursor.fetchall()]
+        await cursor.execute(queries.PAYSLIP_LOAN_LINES, (payslip_id,))
+        loans = [{"label": row["loan_name"], "amount": float(row["amount"])} for row in await cursor.fetchall()]
 
         return {
             "fullName": user["full_name"],
@@ -1332,148 +980,30 @@ async def get_latest_payslip(username: str):
         }
 
     finally:
-        if 'cursor' in locals(): cursor.close()
-        if 'connection' in locals(): connection.close()
+        if 'cursor' in locals():
+            await cursor.close()
 
 @app.post("/api/payslip/summary")
-async def get_payslip_summary(data: MonthSelection):
+async def get_payslip_summary(data: MonthSelection, connection=Depends(get_async_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # Get user ID and employment info
-        cursor.execute("""
-            SELECT u.id, e.employment_type, e.base_salary_hour, e.base_monthly_salary, e.salary_grade, u.full_name
-            FROM users u
-            LEFT JOIN employee_profiles e ON u.id = e.user_id
-            WHERE u.username = %s
-        """, (data.username,))
-        user = cursor.fetchone()
+        await cursor.execute(queries.SUMMARY_USER, (data.username,))
+        user = await cursor.fetchone()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        user_id = user["id"]
-        full_name = user["full_name"]
-
-        # Data containers
-        monthly_summary = {}
-        income_breakdown = defaultdict(lambda: defaultdict(float))
-        deduction_breakdown = defaultdict(lambda: defaultdict(float))
-        quarter_totals = defaultdict(float)
-        month_list = []
-
-        # Quarter label mapping
-        quarter_map = {
-            1: "Jan-Mar",
-            2: "Apr-Jun",
-            3: "Jul-Sep",
-            4: "Oct-Dec"
-        }
-
-        for entry in data.selected_months:
-            month = entry.month
-            year = entry.year
-
-            cursor.execute("""
-                SELECT *
-                FROM payslips
-                WHERE user_id = %s AND month = %s AND year = %s
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (user_id, month, year))
-            payslip = cursor.fetchone()
-            if not payslip:
-                continue
-
-            payslip_id = payslip["id"]
-            month_key = f"{month} {year}"
-            month_list.append(month_key)
-
-            # Get quarter key for potential future use
-            try:
-                month_index = list(calendar.month_name).index(month.capitalize())
-                quarter = (month_index - 1) // 3 + 1
-                quarter_key = f"{quarter_map[quarter]} {year}"
-            except:
-                quarter_key = f"Q{month} {year}"
-
-            gross = float(payslip.get("gross_income", 0))
-            deductions = float(payslip.get("total_deductions", 0))
-            net = float(payslip.get("net_income", 0))
-
-            monthly_summary[month_key] = {
-                "gross_income": gross,
-                "total_deductions": deductions,
-                "net_income": net,
-                "quarter": quarter_key
-            }
-
-            quarter_totals[f"{quarter_key}_gross"] += gross
-            quarter_totals[f"{quarter_key}_deductions"] += deductions
-            quarter_totals[f"{quarter_key}_net"] += net
-
-            # Base salary
-            income_breakdown["Base Salary"][month_key] += gross
-
-            # Bonuses
-            cursor.execute("""
-                SELECT bonus_name, amount
-                FROM payslip_bonuses
-                WHERE payslip_id = %s
-            """, (payslip_id,))
-            for bonus in cursor.fetchall():
-                income_breakdown[bonus["bonus_name"]][month_key] += float(bonus["amount"])
-
-            # Loan deductions
-            cursor.execute("""
-                SELECT pl.loan_name, pl.amount,
-                       (SELECT balance FROM employee_loans 
-                        WHERE user_id = %s AND loan_name = pl.loan_name
-                        ORDER BY created_at DESC LIMIT 1) as balance
-                FROM payslip_loan_deductions pl
-                WHERE pl.payslip_id = %s
-            """, (user_id, payslip_id))
-            
-            for loan in cursor.fetchall():
-                deduction_breakdown[loan["loan_name"]][month_key] += float(loan["amount"])
-                deduction_breakdown[f"{loan['loan_name']}_balance"][month_key] = float(loan["balance"]) if loan["balance"] is not None else 0.0
-
-            # Gov deductions
-            gsis = float(payslip.get("total_deductions", 0)) - float(payslip.get("loan_deduction", 0)) - float(payslip.get("tax_deduction", 0)) - float(payslip.get("philhealth_deduction", 0))
-            philhealth = float(payslip.get("philhealth_deduction", 0))
-            tax = float(payslip.get("tax_deduction", 0))
-
-            deduction_breakdown["GSIS"][month_key] += gsis
-            deduction_breakdown["PhilHealth"][month_key] += philhealth
-            deduction_breakdown["Tax"][month_key] += tax
-
-        # Compute totals
-        total_gross = sum(month["gross_income"] for month in monthly_summary.values())
-        total_deductions = sum(month["total_deductions"] for month in monthly_summary.values())
-        total_net = sum(month["net_income"] for month in monthly_summary.values())
-
-        quarter_summary = {}
-        for quarter in set(m["quarter"] for m in monthly_summary.values()):
-            quarter_summary[quarter] = {
-                "gross_income": quarter_totals[f"{quarter}_gross"],
-                "total_deductions": quarter_totals[f"{quarter}_deductions"],
-                "net_income": quarter_totals[f"{quarter}_net"]
-            }
+        # Every selected payslip with its bonus and loan lines in three queries
+        periods = [(entry.month, entry.year) for entry in data.selected_months]
+        rows = await run_in_db_thread(load_summary_rows, connection.raw, user["id"], periods)
+        summary = build_summary(periods, *rows)
 
         return {
-            "fullName": full_name,
+            "fullName": user["full_name"],
             "employmentType": user.get("employment_type", "regular"),
             "salaryGrade": user.get("salary_grade", ""),
-            "monthlySummary": monthly_summary,
-            "quarterSummary": quarter_summary,  # still useful for charts
-            "incomeBreakdown": dict(income_breakdown),
-            "deductionBreakdown": dict(deduction_breakdown),
-            "totals": {
-                "gross_income": total_gross,
-                "total_deductions": total_deductions,
-                "net_income": total_net
-            },
-            "months": month_list
+            **summary
         }
 
     except Exception as e:
@@ -1481,40 +1011,58 @@ async def get_payslip_summary(data: MonthSelection):
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
-        if 'connection' in locals() and connection.is_connected():
-            cursor.close()
-            connection.close()
+        if 'cursor' in locals():
+            await cursor.close()
+
+@app.get("/api/reports/totals")
+async def get_report_totals(year: int, username: Optional[str] = None, connection=Depends(get_async_db)):
+    """Month, quarter and year totals for one employee, or the whole office without a username."""
+    try:
+        cursor = connection.cursor(dictionary=True)
+        user_id = OFFICE
+        if username:
+            await cursor.execute(queries.USER_BY_USERNAME, (username,))
+            user = await cursor.fetchone()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            user_id = user["id"]
+
+        totals = await run_in_db_thread(year_totals, connection.raw, user_id, year)
+        return {"scope": username or "office", "year": year, **totals}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if 'cursor' in locals():
+            await cursor.close()
 
 @app.get("/api/records")
-async def get_user_records(username: str = Query(...)):
+async def get_user_records(request: Request, response: Response, username: str = Query(...),
+                           connection=Depends(get_async_db)):
     try:
-        connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor(dictionary=True)
 
         # Get user ID
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        await cursor.execute(queries.USER_BY_USERNAME, (username,))
+        user = await cursor.fetchone()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         user_id = user["id"]
 
+        await cursor.execute(queries.USER_PAYSLIPS_VERSION, (user_id,))
+        etag = http_cache.make_etag("records", *(await cursor.fetchone()).values())
+        unchanged = http_cache.not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
         # Get payslip records
-        cursor.execute("""
-            SELECT 
-                p.month, 
-                p.year,
-                p.gross_income,
-                p.total_deductions,
-                p.net_income,
-                p.created_at
-            FROM payslips p
-            WHERE p.user_id = %s
-            ORDER BY p.year DESC, 
-                     STR_TO_DATE(CONCAT('01 ', p.month), '%%d %%M') DESC
-        """, (user_id,))
+        await cursor.execute(queries.USER_RECORDS, (user_id,))
         
-        payslips = cursor.fetchall()
+        payslips = await cursor.fetchall()
 
         # Format data
         formatted = []
@@ -1539,6 +1087,5 @@ async def get_user_records(username: str = Query(...)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        if 'cursor' in locals():
+            await cursor.close()
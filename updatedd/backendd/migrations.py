@@ -0,0 +1,250 @@
+"""
+Schema changes applied once at startup, in order, and recorded in schema_migrations.
+Each step is either a SQL string or a function taking a cursor. MySQL commits DDL
+immediately, so functions check the current schema before changing it.
+"""
+import calendar
+
+from backfill_dtr_minutes import backfill
+from dtr_time import AM_START, MINUTE_COLUMNS, MINUTES_PER_DAY, PM_START, TIME_FIELDS
+from loan_schedule import backfill_schedules
+from payroll_totals import backfill_totals
+
+
+class MigrationBlocked(Exception):
+    pass
+
+
+def has_index(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def has_column(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def dtrs_unique_period(cursor):
+    if has_index(cursor, "dtrs", "uniq_dtrs_user_period"):
+        return
+    cursor.execute("""
+        SELECT user_id, year, month, COUNT(*) FROM dtrs
+        GROUP BY user_id, year, month
+        HAVING COUNT(*) > 1
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        raise MigrationBlocked(
+            f"dtrs has {len(duplicates)} duplicate (user_id, year, month) uploads, e.g. {duplicates[0][:3]}; "
+            "remove the extra rows and restart"
+        )
+    cursor.execute("ALTER TABLE dtrs ADD UNIQUE KEY uniq_dtrs_user_period (user_id, year, month)")
+
+
+def dtr_days_minute_columns(cursor):
+    missing = [
+        (field, column) for field, column in zip(TIME_FIELDS, MINUTE_COLUMNS)
+        if not has_column(cursor, "dtr_days", column)
+    ]
+    if missing:
+        cursor.execute("ALTER TABLE dtr_days " + ", ".join(
+            f"ADD COLUMN {column} SMALLINT UNSIGNED NULL AFTER {field}" for field, column in missing
+        ))
+
+
+def payslip_input_tracking(cursor):
+    if not has_column(cursor, "payslips", "input_hash"):
+        cursor.execute("ALTER TABLE payslips ADD COLUMN input_hash CHAR(64) NULL")
+    if not has_column(cursor, "payslip_loan_deductions", "loan_id"):
+        cursor.execute("ALTER TABLE payslip_loan_deductions ADD COLUMN loan_id INT NULL AFTER payslip_id")
+
+
+# Month names as stored by the DTR parser and payroll ("May"); FIELD compares
+# case-insensitively under the tables' collation and gives 0 for anything else
+MONTH_NUM = "FIELD(TRIM(month), " + ", ".join(f"'{name}'" for name in calendar.month_name[1:]) + ")"
+
+# Per-user period lookups and "newest first" listings; dtrs has uploaded_at
+PERIOD_INDEXES = {
+    "payslips": ("idx_payslips_user_period", "user_id, year, month_num, created_at"),
+    "dtrs": ("idx_dtrs_user_period", "user_id, year, month_num, uploaded_at"),
+}
+
+
+def month_num_columns(cursor):
+    for table, (index, columns) in PERIOD_INDEXES.items():
+        if not has_column(cursor, table, "month_num"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN month_num TINYINT AS ({MONTH_NUM}) STORED AFTER month")
+        if not has_index(cursor, table, index):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+    # The payroll run loads a whole period across users
+    if not has_index(cursor, "dtrs", "idx_dtrs_period"):
+        cursor.execute("ALTER TABLE dtrs ADD INDEX idx_dtrs_period (year, month_num)")
+
+
+def payslip_loan_balances(cursor):
+    if not has_column(cursor, "payslip_loan_deductions", "balance_after"):
+        cursor.execute("ALTER TABLE payslip_loan_deductions ADD COLUMN balance_after DECIMAL(10,2) NULL AFTER amount")
+    # Lines written before the snapshot: the balance from the loan's schedule row for
+    # the payslip's period, finding the loan by name where loan_id was not recorded
+    cursor.execute("""
+        UPDATE payslip_loan_deductions pl
+        JOIN payslips p ON p.id = pl.payslip_id
+        JOIN loan_schedule s
+            ON s.loan_id = COALESCE(pl.loan_id, (SELECT id FROM employee_loans
+                WHERE user_id = p.user_id AND loan_name = pl.loan_name
+                ORDER BY created_at DESC LIMIT 1))
+            AND s.year = p.year AND s.month_num = p.month_num
+        SET pl.balance_after = s.balance_after
+        WHERE pl.balance_after IS NULL
+    """)
+    if not has_index(cursor, "payslip_loan_deductions", "fk_payslip_loan_deductions_loan"):
+        # Profile saves used to replace loans, so old lines can point at deleted ones
+        cursor.execute("""
+            UPDATE payslip_loan_deductions SET loan_id = NULL
+            WHERE loan_id IS NOT NULL AND loan_id NOT IN (SELECT id FROM employee_loans)
+        """)
+        cursor.execute("""
+            ALTER TABLE payslip_loan_deductions ADD CONSTRAINT fk_payslip_loan_deductions_loan
+            FOREIGN KEY (loan_id) REFERENCES employee_loans (id) ON DELETE SET NULL
+        """)
+
+
+def payslip_updated_at(cursor):
+    # Part of the payslip endpoints' ETags, so a payslip corrected in place is re-sent
+    if not has_column(cursor, "payslips", "updated_at"):
+        cursor.execute("""
+            ALTER TABLE payslips ADD COLUMN updated_at TIMESTAMP NOT NULL
+            DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP AFTER created_at
+        """)
+
+
+def payslip_leave_snapshot(cursor):
+    # The leave credits a payslip was computed from, for payroll_run's input hash
+    if not has_column(cursor, "payslips", "leave_credits_before"):
+        cursor.execute("ALTER TABLE payslips ADD COLUMN leave_credits_before FLOAT NULL AFTER leave_used")
+
+
+# "Newest first" per user without a filesort: /payslip/latest and the profile's bonuses and loans
+CREATED_INDEXES = {
+    "payslips": "idx_payslips_user_created",
+    "employee_bonuses": "idx_employee_bonuses_user_created",
+    "employee_loans": "idx_employee_loans_user_created",
+}
+
+
+def created_at_indexes(cursor):
+    for table, index in CREATED_INDEXES.items():
+        if not has_index(cursor, table, index):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} (user_id, created_at)")
+
+
+def signed(column):
+    # Subtracting from an UNSIGNED column is an error when the result goes negative
+    return f"CAST({column} AS SIGNED)"
+
+
+# One row per DTR with the figures dtr_attendance.summarize_days computes in Python;
+# check_dtr_attendance.py compares the two
+DTR_ATTENDANCE_VIEW = f"""
+    CREATE OR REPLACE VIEW dtr_attendance AS
+    SELECT
+        dtr_id,
+        COUNT(*) AS day_rows,
+        COALESCE(SUM(CASE
+            WHEN {' AND '.join(f'{column} IS NOT NULL' for column in MINUTE_COLUMNS)}
+            THEN MOD(MOD(
+                {signed('am_departure_min')} - {signed('am_arrival_min')}
+                + {signed('pm_departure_min')} - {signed('pm_arrival_min')},
+                {MINUTES_PER_DAY}) + {MINUTES_PER_DAY}, {MINUTES_PER_DAY})
+            ELSE 0
+        END), 0) AS total_minutes,
+        COALESCE(SUM(am_arrival <> '' AND pm_arrival <> ''), 0) AS days_present,
+        COALESCE(SUM(GREATEST({signed('am_arrival_min')} - {AM_START}, 0)), 0)
+            + COALESCE(SUM(GREATEST({signed('pm_arrival_min')} - {PM_START}, 0)), 0) AS late_minutes,
+        COALESCE(SUM(COALESCE(undertime_hours, 0) * 60 + COALESCE(undertime_minutes, 0)), 0) AS undertime_minutes
+    FROM dtr_days
+    GROUP BY dtr_id
+"""
+
+
+MIGRATIONS = [
+    ("0001_dtrs_unique_period", [dtrs_unique_period]),
+    ("0002_dtr_days_minutes", [dtr_days_minute_columns, backfill]),
+    ("0003_dtr_attendance_view", [DTR_ATTENDANCE_VIEW]),
+    ("0004_holidays", ["""
+        CREATE TABLE IF NOT EXISTS holidays (
+            holiday_date DATE PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """]),
+    ("0005_payslip_input_tracking", [payslip_input_tracking]),
+    ("0006_loan_schedule", ["""
+        CREATE TABLE IF NOT EXISTS loan_schedule (
+            loan_id INT NOT NULL,
+            user_id INT NOT NULL,
+            year SMALLINT NOT NULL,
+            month_num TINYINT NOT NULL,
+            payment DECIMAL(10,2) NOT NULL,
+            balance_after DECIMAL(10,2) NOT NULL,
+            PRIMARY KEY (loan_id, year, month_num),
+            KEY idx_loan_schedule_period (user_id, year, month_num),
+            CONSTRAINT fk_loan_schedule_loan FOREIGN KEY (loan_id) REFERENCES employee_loans (id) ON DELETE CASCADE
+        )
+    """, backfill_schedules]),
+    ("0007_payroll_totals", ["""
+        CREATE TABLE IF NOT EXISTS payroll_totals (
+            user_id INT NOT NULL,
+            year SMALLINT NOT NULL,
+            period_type ENUM('month', 'quarter', 'year') NOT NULL,
+            period TINYINT NOT NULL,
+            payslips INT NOT NULL DEFAULT 0,
+            gross_income DECIMAL(14,2) NOT NULL DEFAULT 0,
+            bonuses DECIMAL(14,2) NOT NULL DEFAULT 0,
+            total_deductions DECIMAL(14,2) NOT NULL DEFAULT 0,
+            net_income DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, year, period_type, period)
+        )
+    """, backfill_totals]),
+    ("0008_month_num", [month_num_columns]),
+    ("0009_payslip_loan_balances", [payslip_loan_balances]),
+    ("0010_payslip_updated_at", [payslip_updated_at]),
+    ("0011_created_at_indexes", [created_at_indexes]),
+    ("0012_payslip_leave_snapshot", [payslip_leave_snapshot]),
+]
+
+
+def apply_migrations(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(100) PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for name, steps in MIGRATIONS:
+            if name in applied:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            connection.commit()
+            print(f"Applied migration {name}")
+    finally:
+        cursor.close()
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# OCR result cache settings
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE", "1") == "1"
+OCR_CACHE_PATH = os.getenv(
+    "OCR_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache.sqlite3")
+)
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+_local = threading.local()
+_stats = {"document_hits": 0, "document_misses": 0, "page_hits": 0, "page_misses": 0}
+_stats_lock = threading.Lock()
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _conn():
+    # One connection per thread and per process (the OCR workers use the cache too)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(OCR_CACHE_PATH, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache (last_used)")
+        track_bytes(conn, "ocr_cache")
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def track_bytes(conn, table):
+    """
+    Keep SUM(size) of table in a one-row <table>_bytes table, maintained by triggers,
+    so writers check the cache size with a primary key read instead of a full scan.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_bytes (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+        # Cache files from before the counter start from their current size
+        conn.execute(f"INSERT OR IGNORE INTO {table}_bytes (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM {table}")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_added AFTER INSERT ON {table}
+            BEGIN UPDATE {table}_bytes SET total = total + NEW.size; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_removed AFTER DELETE ON {table}
+            BEGIN UPDATE {table}_bytes SET total = total - OLD.size; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_resized AFTER UPDATE OF size ON {table}
+            BEGIN UPDATE {table}_bytes SET total = total + NEW.size - OLD.size; END
+        """)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def cached_bytes(conn, table):
+    return conn.execute(f"SELECT total FROM {table}_bytes WHERE id = 0").fetchone()[0]
+
+
+def get(key):
+    if not OCR_CACHE_ENABLED:
+        return None
+    try:
+        conn = _conn()
+        row = conn.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+    except sqlite3.Error as e:
+        print(f"⚠️ OCR cache read failed: {e}")
+        return None
+
+
+def put(key, value):
+    if not OCR_CACHE_ENABLED:
+        return
+    try:
+        conn = _conn()
+        size = len(value.encode("utf-8"))
+        # An upsert, not INSERT OR REPLACE: REPLACE deletes the old row without firing the delete trigger
+        conn.execute("""
+            INSERT INTO ocr_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, last_used = excluded.last_used
+        """, (key, value, size, time.time()))
+        _evict(conn)
+    except sqlite3.Error as e:
+        print(f"⚠️ OCR cache write failed: {e}")
+
+
+def _evict(conn):
+    total = cached_bytes(conn, "ocr_cache")
+    if total <= OCR_CACHE_MAX_BYTES:
+        return
+    # Drop least recently used entries until we are back under 90% of the limit
+    target = OCR_CACHE_MAX_BYTES * 0.9
+    doomed = []
+    for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_used ASC"):
+        if total <= target:
+            break
+        doomed.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM ocr_cache WHERE key = ?", doomed)
+
+
+def record(kind, hit):
+    with _stats_lock:
+        _stats[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    for kind in ("document", "page"):
+        lookups = result[f"{kind}_hits"] + result[f"{kind}_misses"]
+        result[f"{kind}_hit_rate"] = round(result[f"{kind}_hits"] / lookups, 4) if lookups else 0.0
+    result["enabled"] = OCR_CACHE_ENABLED
+    result["max_bytes"] = OCR_CACHE_MAX_BYTES
+    if OCR_CACHE_ENABLED:
+        try:
+            conn = _conn()
+            result["entries"] = conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+            result["bytes"] = cached_bytes(conn, "ocr_cache")
+        except sqlite3.Error:
+            pass
+    return result
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+import traceback
+import uuid
+
+import mysql.connector
+from fastapi import HTTPException
+
+from db_async import run_pooled
+from db_pool import pool
+from dtr_ingest import ingest_dtr_text
+from ocr_workers import ocr_document
+
+# Job queue settings
+OCR_JOB_RUNNERS = int(os.getenv("OCR_JOB_RUNNERS", 2))          # jobs processed at the same time
+OCR_JOB_QUEUE_SIZE = int(os.getenv("OCR_JOB_QUEUE_SIZE", 500))  # jobs waiting before we answer 429
+OCR_JOB_RETENTION = int(os.getenv("OCR_JOB_RETENTION", 3600))   # seconds a finished job stays queryable
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+_jobs = {}
+_queue = None
+_runners = []
+
+
+def _now():
+    return time.time()
+
+
+def _prune():
+    cutoff = _now() - OCR_JOB_RETENTION
+    for job_id in [j["id"] for j in _jobs.values() if j["finished_at"] and j["finished_at"] < cutoff]:
+        del _jobs[job_id]
+
+
+def submit(user_id, full_name, username, filename, contents, replace_existing=False):
+    if _queue is None:
+        raise RuntimeError("OCR job runners are not started")
+    _prune()
+
+    job = {
+        "id": uuid.uuid4().hex,
+        "username": username,
+        "filename": filename,
+        "replace_existing": replace_existing,
+        "status": "queued",
+        "pages_total": None,
+        "pages": [],
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "status_code": None,
+        "result": None,
+        "_user_id": user_id,
+        "_full_name": full_name,
+        "_contents": contents,
+    }
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        raise JobQueueFull(f"OCR job queue is full ({OCR_JOB_QUEUE_SIZE} jobs waiting), try again shortly")
+    _jobs[job["id"]] = job
+    return job
+
+
+def get_job(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    view = {k: v for k, v in job.items() if not k.startswith("_")}
+    view["pages_done"] = sum(1 for p in job["pages"] if p["status"] == "done")
+    return view
+
+
+def metrics():
+    statuses = {}
+    for job in _jobs.values():
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+    return {
+        "runners": OCR_JOB_RUNNERS,
+        "queued": _queue.qsize() if _queue else 0,
+        "max_queued": OCR_JOB_QUEUE_SIZE,
+        "jobs": statuses,
+    }
+
+
+def _ingest(job, full_text):
+    with pool.connection() as connection:
+        return ingest_dtr_text(
+            connection, job["_user_id"], job["_full_name"], full_text, job["replace_existing"]
+        )
+
+
+async def _run_job(job):
+    job["status"] = "running"
+    job["started_at"] = _now()
+
+    def on_start(pages):
+        job["pages_total"] = pages
+        job["pages"] = [{"page": n, "status": "pending"} for n in range(1, pages + 1)]
+
+    def on_page(page_number, text):
+        job["pages"][page_number - 1]["status"] = "done"
+
+    try:
+        # Synchronous /ocr traffic may hold the workers; wait our turn instead of failing
+        page_texts = await ocr_document(job["_contents"], job["filename"], on_start, on_page, wait=True)
+
+        full_text = "\n\n".join(page_texts)
+        job["status"] = "parsing"
+        extracted_data = await run_pooled(_ingest, job, full_text)
+
+        job["result"] = {
+            "text": full_text,
+            "parsedDTRs": extracted_data,
+            "database": {
+                "dtrs_inserted": len(extracted_data),
+                "days_inserted": sum(len(d["dailyRecords"]) for d in extracted_data)
+            }
+        }
+        job["status"] = "done"
+    except HTTPException as e:
+        job["status"] = "failed"
+        job["status_code"] = e.status_code
+        job["error"] = e.detail
+    except mysql.connector.Error as err:
+        print(f"Database error in OCR job {job['id']}: {err}")
+        job["status"] = "failed"
+        job["status_code"] = 500
+        job["error"] = f"Database error: {err.msg}"
+    except Exception as err:
+        traceback.print_exc()
+        job["status"] = "failed"
+        job["status_code"] = 500
+        job["error"] = f"OCR processing failed: {str(err)}"
+    finally:
+        job["finished_at"] = _now()
+        job["_contents"] = None
+
+
+async def _runner():
+    while True:
+        job = await _queue.get()
+        try:
+            await _run_job(job)
+        finally:
+            _queue.task_done()
+
+
+async def start():
+    global _queue
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue(maxsize=OCR_JOB_QUEUE_SIZE)
+    for _ in range(OCR_JOB_RUNNERS):
+        _runners.append(asyncio.create_task(_runner()))
+
+
+async def stop():
+    global _queue
+    for task in _runners:
+        task.cancel()
+    await asyncio.gather(*_runners, return_exceptions=True)
+    _runners.clear()
+    _queue = None
@@ -0,0 +1,242 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+
+import ocr_cache
+import ocr_preprocess
+
+# Tesseract path
+pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD", r"C:\Program Files\Tesseract-OCR\tesseract.exe")
+POPPLER_PATH = os.getenv("POPPLER_PATH", r"C:\poppler\poppler-24.08.0\Library\bin")
+
+# Worker settings
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 2))   # processes running Tesseract
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", OCR_WORKERS * 4))  # pages queued or running before we refuse work
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"                # rasterize straight to 8-bit gray
+OCR_PAGE_WINDOW = int(os.getenv("OCR_PAGE_WINDOW", OCR_WORKERS))      # pages of one document rasterized at once
+
+
+class OCRSaturated(Exception):
+    pass
+
+
+def settings_tag():
+    # Anything that changes OCR output must be part of the cache key
+    return f"dpi={OCR_DPI};gray={int(OCR_GRAYSCALE)};pre={ocr_preprocess.signature()}"
+
+
+# --- Runs inside the worker processes ---
+
+def ocr_pil_image(img, dpi=None):
+    """OCR one rasterized page, reusing the cached text for identical pixels. Returns (text, cache_hit)."""
+    key = f"page:{settings_tag()}:{ocr_cache.sha256(img.mode.encode() + str(img.size).encode() + img.tobytes())}"
+    text = ocr_cache.get(key)
+    if text is not None:
+        return text, True
+    text = "\n".join(
+        pytesseract.image_to_string(region, config=config)
+        for _, region, config in ocr_preprocess.prepare(img, dpi)
+    )
+    ocr_cache.put(key, text)
+    return text, False
+
+
+def ocr_pdf_page(pdf_path, page_number, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE):
+    # Only this one page is ever rasterized in this process, and it is freed right after OCR
+    images = convert_from_path(
+        pdf_path, dpi=dpi, grayscale=grayscale,
+        first_page=page_number, last_page=page_number, poppler_path=POPPLER_PATH
+    )
+    try:
+        results = [ocr_pil_image(img, dpi) for img in images]
+    finally:
+        for img in images:
+            img.close()
+    return "\n\n".join(text for text, _ in results), all(hit for _, hit in results)
+
+
+def ocr_image(contents, grayscale=OCR_GRAYSCALE):
+    with Image.open(io.BytesIO(contents)) as img:
+        return ocr_pil_image(img.convert("L") if grayscale else img)
+
+
+# --- Runs in the API process ---
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+# Callers that wait for room queue here in arrival order
+_wait_turn = asyncio.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _saturated():
+    return OCRSaturated(f"OCR queue is full ({_pending}/{OCR_MAX_PENDING} pages pending), try again shortly")
+
+
+def _check_room():
+    # Cheap test before spooling an upload whose page count is not known yet
+    with _pending_lock:
+        if _pending >= OCR_MAX_PENDING:
+            raise _saturated()
+
+
+def _reserve(pages):
+    global _pending
+    with _pending_lock:
+        # A document bigger than the whole queue is still accepted when the queue is empty
+        if _pending and _pending + pages > OCR_MAX_PENDING:
+            raise _saturated()
+        _pending += pages
+
+
+async def _wait_for(check, *args):
+    while True:
+        try:
+            return check(*args)
+        except OCRSaturated:
+            await asyncio.sleep(0.5)
+
+
+def _release(pages):
+    global _pending
+    with _pending_lock:
+        _pending -= pages
+
+
+def _spool_pdf(contents):
+    # Workers read pages from disk instead of each receiving a pickled copy of the upload
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="dtr_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contents)
+        return path, pdfinfo_from_path(path, poppler_path=POPPLER_PATH)["Pages"]
+    except Exception:
+        _remove(path)
+        raise
+
+
+async def _spool(loop, contents, is_pdf):
+    # (path, pages); images go to the worker as bytes
+    if not is_pdf:
+        return None, 1
+    return await loop.run_in_executor(None, _spool_pdf, contents)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def ocr_document(contents, filename, on_start=None, on_page=None, wait=False):
+    """
+    OCR an uploaded PDF or image, one worker task per page, at most OCR_PAGE_WINDOW
+    pages of the document rasterized at a time so memory does not grow with page count.
+    Returns the page texts in page order. Raises OCRSaturated when the queue is full,
+    unless wait is set, in which case it waits for room (used by background work).
+    on_start(pages) and on_page(page_number, text) let callers track progress.
+    """
+    loop = asyncio.get_running_loop()
+    is_pdf = filename.lower().endswith(".pdf")
+
+    # Identical upload seen before: skip rasterization and Tesseract entirely
+    doc_key = f"document:{settings_tag()}:{await loop.run_in_executor(None, ocr_cache.sha256, contents)}"
+    cached = await loop.run_in_executor(None, ocr_cache.get, doc_key)
+    ocr_cache.record("document", cached is not None)
+    if cached is not None:
+        page_texts = json.loads(cached)
+        if on_start:
+            on_start(len(page_texts))
+        if on_page:
+            for page_number, text in enumerate(page_texts, start=1):
+                on_page(page_number, text)
+        return page_texts
+
+    # Only spool the upload once there is room for at least one more page
+    pdf_path = None
+    try:
+        if wait:
+            # One waiter at a time, oldest first, so small documents can't keep overtaking a big one
+            async with _wait_turn:
+                await _wait_for(_check_room)
+                pdf_path, pages = await _spool(loop, contents, is_pdf)
+                await _wait_for(_reserve, pages)
+        else:
+            _check_room()
+            pdf_path, pages = await _spool(loop, contents, is_pdf)
+            _reserve(pages)
+        try:
+            return await _ocr_pages(loop, contents, pdf_path, pages, doc_key, on_start, on_page)
+        finally:
+            _release(pages)
+    finally:
+        if pdf_path:
+            await loop.run_in_executor(None, _remove, pdf_path)
+
+
+async def _ocr_pages(loop, contents, pdf_path, pages, doc_key, on_start, on_page):
+    if on_start:
+        on_start(pages)
+    executor = get_executor()
+    window = asyncio.Semaphore(max(OCR_PAGE_WINDOW, 1))
+
+    async def run_page(page_number):
+        async with window:
+            if pdf_path:
+                text, hit = await loop.run_in_executor(executor, ocr_pdf_page, pdf_path, page_number)
+            else:
+                text, hit = await loop.run_in_executor(executor, ocr_image, contents)
+        ocr_cache.record("page", hit)
+        if on_page:
+            on_page(page_number, text)
+        return text
+
+    # Wait for every page before the caller frees the slots, even if one fails
+    results = await asyncio.gather(*(run_page(n) for n in range(1, pages + 1)), return_exceptions=True)
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    await loop.run_in_executor(None, ocr_cache.put, doc_key, json.dumps(results))
+    return results
+
+
+def metrics():
+    with _pending_lock:
+        return {
+            "workers": OCR_WORKERS,
+            "pending_pages": _pending,
+            "max_pending": OCR_MAX_PENDING,
+            "page_window": OCR_PAGE_WINDOW,
+            "dpi": OCR_DPI,
+            "grayscale": OCR_GRAYSCALE,
+            "preprocess": ocr_preprocess.OCR_PREPROCESS,
+        }
@@ -0,0 +1,308 @@
+"""
+Payroll math with no database or HTTP access.
+
+Inputs are plain dicts shaped like the rows of dtrs, dtr_days, employee_profiles,
+employee_bonuses and the period's loan_schedule rows (joined with the loan name); the
+result says what to store, it stores nothing.
+
+Hours and attendance come in as one summary per DTR, a row of the dtr_attendance
+view that adds up dtr_days in MySQL. Runs without a database (what-if runs, the
+benchmark) pass the dtr_days rows as days_by_dtr instead, summarized by the
+dtr_attendance module. compute_payslip handles one employee, compute_period a whole
+period, and compute_period_columnar does the period, day rows included, with NumPy
+arrays; compute_batch picks the columnar one when NumPy is installed.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+import dtr_attendance
+import work_calendar
+
+try:
+    import numpy as np
+except ImportError:  # optional, only the columnar batch path needs it
+    np = None
+
+FALLBACK_WORKING_DAYS = 22
+
+# Bump when the payslip math changes so stored payslips no longer match input_hash
+ENGINE_VERSION = 2
+PROFILE_FIELDS = (
+    "employment_type", "base_salary_hour", "base_monthly_salary", "leave_credits",
+    "gsis_deduction", "philhealth_deduction", "tax_deduction"
+)
+LOAN_FIELDS = ("loan_id", "loan_name", "payment", "balance_after")
+BONUS_FIELDS = ("bonus_name", "amount", "frequency")
+
+
+def count_working_days(year, month):
+    """Working days from work_calendar (weekends and holidays excluded). Falls back to 22."""
+    try:
+        return work_calendar.working_days(year, month)
+    except (TypeError, ValueError):
+        return FALLBACK_WORKING_DAYS
+
+
+# Attendance of a DTR without day rows
+EMPTY_ATTENDANCE = {"day_rows": 0, "total_minutes": 0, "days_present": 0, "late_minutes": 0, "undertime_minutes": 0}
+
+
+def compute_loans(installments):
+    """
+    Loan deductions from the period's loan_schedule rows (see loan_schedule.py).
+    Returns (total_deduction, [deduction items]).
+    """
+    items = [
+        {
+            'loan_id': row['loan_id'],
+            'loan_name': row['loan_name'],
+            'amount': float(row['payment']),
+            'new_balance': float(row['balance_after'])
+        }
+        for row in installments
+    ]
+    return sum(item['amount'] for item in items), items
+
+
+def compute_bonuses(bonuses, month):
+    """Monthly bonuses always apply, yearly ones only in December."""
+    total = 0.0
+    items = []
+    for b in bonuses:
+        try:
+            if b["frequency"] == "monthly" or (b["frequency"] == "yearly" and month.lower() == "december"):
+                total += float(b["amount"])
+                items.append({'bonus_name': b["bonus_name"], 'amount': float(b["amount"])})
+        except Exception as e:
+            print(f"⚠️ Error processing bonus: {str(e)}")
+            continue
+    return total, items
+
+
+def profile_values(profile):
+    """Numeric payroll settings from an employee_profiles row. Raises ValueError."""
+    try:
+        return {
+            "rate": float(profile["base_salary_hour"]),
+            "monthly_salary": float(profile["base_monthly_salary"]),
+            "employment_type": profile["employment_type"],
+            "leave_credits": float(profile["leave_credits"] or 0),
+            "philhealth": float(profile["philhealth_deduction"] or 0),
+            "tax": float(profile["tax_deduction"] or 0),
+            "gsis": float(profile["gsis_deduction"] or 0),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid payroll values: {str(e)}")
+
+
+def build_result(dtr, values, working_days, days_present, days_absent, leave_used, total_hours,
+                 gross, loans, bonuses, new_leave_credits):
+    loan_deduction, loan_items = loans
+    bonus_total, bonus_items = bonuses
+    total_deductions = round(values["gsis"] + values["philhealth"] + values["tax"] + loan_deduction, 2)
+    net = round(gross + bonus_total - total_deductions, 2)
+    return {
+        "user_id": dtr["user_id"],
+        "dtr_id": dtr["id"],
+        "employee_name": dtr.get("employee_name"),
+        "month": dtr["month"],
+        "year": dtr["year"],
+        "working_days": working_days,
+        "days_present": days_present,
+        "days_absent": days_absent,
+        "leave_used": leave_used,
+        "total_hours": round(total_hours, 2),
+        "gross_income": round(gross, 2),
+        "bonuses": round(bonus_total, 2),
+        "philhealth_deduction": values["philhealth"],
+        "tax_deduction": values["tax"],
+        "loan_deduction": round(loan_deduction, 2),
+        "total_deductions": total_deductions,
+        "net_income": net,
+        "bonus_items": bonus_items,
+        "loan_items": loan_items,
+        "new_leave_credits": new_leave_credits,
+    }
+
+
+def compute_payslip(dtr, attendance, profile, loans, bonuses, working_days=None):
+    """
+    Compute one payslip from the DTR's attendance summary; loans are the period's
+    loan_schedule rows.
+    Raises ValueError when the payroll profile has unusable values.
+    Returns the payslip columns plus bonus_items, loan_items and new_leave_credits
+    (None when leave credits don't change).
+    """
+    month = dtr["month"]
+    year = dtr["year"]
+    if working_days is None:
+        working_days = count_working_days(year, month)
+
+    total_hours = int(attendance["total_minutes"]) / 60
+    days_present = int(attendance["days_present"])
+    values = profile_values(profile)
+
+    new_leave_credits = None
+    if values["employment_type"] == "irregular":
+        gross = total_hours * values["rate"]
+        days_absent = 0
+        leave_used = 0
+    else:
+        days_absent = max(working_days - days_present, 0)
+        leave_used = min(values["leave_credits"], days_absent)
+        unpaid_absent_days = max(days_absent - leave_used, 0)
+        absent_deduction = round((values["monthly_salary"] / working_days) * unpaid_absent_days, 2)
+        gross = values["monthly_salary"] - absent_deduction
+        new_leave_credits = values["leave_credits"] - leave_used
+
+    return build_result(
+        dtr, values, working_days, days_present, days_absent, leave_used, total_hours, gross,
+        compute_loans(loans), compute_bonuses(bonuses, month), new_leave_credits
+    )
+
+
+def _hash_value(value):
+    # 5000, 5000.0 and Decimal("5000.00") must hash the same
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return round(float(value), 4)
+    return value if value is None else str(value)
+
+
+def input_hash(dtr, attendance, profile, loans, bonuses, working_days):
+    """
+    Fingerprint of everything compute_payslip reads for one DTR. Pass the profile as
+    it was before this period was paid (see payroll_run.restore_inputs).
+    """
+    payload = {
+        "engine": ENGINE_VERSION,
+        "dtr": [dtr["id"], dtr["month"], dtr["year"]],
+        "attendance": [int(attendance["total_minutes"]), int(attendance["days_present"])],
+        "working_days": working_days,
+        "profile": [_hash_value(profile.get(field)) for field in PROFILE_FIELDS],
+        "loans": sorted(
+            ([_hash_value(loan.get(field)) for field in LOAN_FIELDS] for loan in loans), key=str
+        ),
+        "bonuses": sorted(
+            ([_hash_value(bonus.get(field)) for field in BONUS_FIELDS] for bonus in bonuses), key=str
+        ),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def with_day_rows(attendance_by_dtr, days_by_dtr, summarize):
+    """attendance_by_dtr plus the summaries of the DTRs in days_by_dtr ({dtr_id: [dtr_days rows]})."""
+    attendance = dict(attendance_by_dtr or {})
+    if days_by_dtr:
+        attendance.update(summarize(days_by_dtr))
+    return attendance
+
+
+def compute_period(dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user, days_by_dtr=None):
+    """
+    compute_payslip for every DTR of a period. DTRs in days_by_dtr get their
+    attendance from those day rows rather than from attendance_by_dtr.
+    Returns (payslips, skipped) where skipped lists employees that could not be paid.
+    """
+    attendance_by_dtr = with_day_rows(
+        attendance_by_dtr, days_by_dtr,
+        lambda days: {dtr_id: dtr_attendance.summarize_days(rows) for dtr_id, rows in days.items()}
+    )
+    payslips, skipped = [], []
+    working_days = {}
+    for dtr in dtrs:
+        user_id = dtr["user_id"]
+        profile = profiles_by_user.get(user_id)
+        if not profile:
+            skipped.append({"user_id": user_id, "dtr_id": dtr["id"], "detail": "Payroll profile not found"})
+            continue
+        period = (dtr["year"], dtr["month"])
+        if period not in working_days:
+            working_days[period] = count_working_days(*period)
+        try:
+            payslips.append(compute_payslip(
+                dtr,
+                attendance_by_dtr.get(dtr["id"], EMPTY_ATTENDANCE),
+                profile,
+                loans_by_user.get(user_id, []),
+                bonuses_by_user.get(user_id, []),
+                working_days=working_days[period]
+            ))
+        except ValueError as e:
+            skipped.append({"user_id": user_id, "dtr_id": dtr["id"], "detail": str(e)})
+    return payslips, skipped
+
+
+def compute_period_columnar(dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user,
+                            days_by_dtr=None):
+    """
+    compute_period with the salary arithmetic done as NumPy arrays. Day rows in
+    days_by_dtr are summarized in one pass over all employees (summarize_days_columnar).
+    Loans and bonuses are a handful of rows per employee and use the scalar helpers.
+    """
+    if np is None:
+        raise RuntimeError("NumPy is not installed, use compute_period")
+
+    attendance_by_dtr = with_day_rows(attendance_by_dtr, days_by_dtr, dtr_attendance.summarize_days_columnar)
+    skipped = []
+    paid, values, loans, bonuses = [], [], [], []
+    working_days_by_period = {}
+    for dtr in dtrs:
+        user_id = dtr["user_id"]
+        profile = profiles_by_user.get(user_id)
+        if not profile:
+            skipped.append({"user_id": user_id, "dtr_id": dtr["id"], "detail": "Payroll profile not found"})
+            continue
+        try:
+            employee_values = profile_values(profile)
+            employee_loans = compute_loans(loans_by_user.get(user_id, []))
+        except ValueError as e:
+            skipped.append({"user_id": user_id, "dtr_id": dtr["id"], "detail": str(e)})
+            continue
+        period = (dtr["year"], dtr["month"])
+        if period not in working_days_by_period:
+            working_days_by_period[period] = count_working_days(*period)
+        paid.append(dtr)
+        values.append(employee_values)
+        loans.append(employee_loans)
+        bonuses.append(compute_bonuses(bonuses_by_user.get(user_id, []), dtr["month"]))
+
+    if not paid:
+        return [], skipped
+
+    attendance = [attendance_by_dtr.get(dtr["id"], EMPTY_ATTENDANCE) for dtr in paid]
+    total_hours = np.array([int(a["total_minutes"]) for a in attendance], dtype=np.int64) / 60
+    days_present = np.array([int(a["days_present"]) for a in attendance], dtype=np.int64)
+
+    working_days = np.array([working_days_by_period[(d["year"], d["month"])] for d in paid], dtype=np.int64)
+    irregular = np.array([v["employment_type"] == "irregular" for v in values])
+    rate = np.array([v["rate"] for v in values])
+    monthly_salary = np.array([v["monthly_salary"] for v in values])
+    leave_credits = np.array([v["leave_credits"] for v in values])
+
+    days_absent = np.where(irregular, 0, np.maximum(working_days - days_present, 0))
+    leave_used = np.where(irregular, 0, np.minimum(leave_credits, days_absent))
+    unpaid_absent_days = np.maximum(days_absent - leave_used, 0)
+    absent_deduction = np.round(monthly_salary / working_days * unpaid_absent_days, 2)
+    gross = np.where(irregular, total_hours * rate, monthly_salary - absent_deduction)
+    new_leave_credits = leave_credits - leave_used
+
+    payslips = [
+        build_result(
+            dtr, values[i], int(working_days[i]), int(days_present[i]), int(days_absent[i]),
+            float(leave_used[i]), float(total_hours[i]), float(gross[i]), loans[i], bonuses[i],
+            None if irregular[i] else float(new_leave_credits[i])
+        )
+        for i, dtr in enumerate(paid)
+    ]
+    return payslips, skipped
+
+
+def compute_batch(dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user, days_by_dtr=None):
+    if np is None:
+        return compute_period(
+            dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user, days_by_dtr
+        )
+    return compute_period_columnar(
+        dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user, days_by_dtr
+    )
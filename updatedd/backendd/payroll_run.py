@@ -0,0 +1,376 @@
+"""
+Month-end payroll run: payslips for every employee with a DTR in the period.
+
+Inputs are loaded with one query per table (IN lists over the period's DTRs, with
+attendance from the dtr_attendance view at one row per DTR), payslips are computed
+in memory with payroll_engine.compute_batch, and everything is written back with
+multi-row INSERTs and CASE UPDATEs in a single transaction.
+
+Loan deductions and balances come from loan_schedule, which payroll only reads;
+payroll_totals is updated with every payslip written or replaced.
+Paying a period again is idempotent: each payslip stores a hash of its inputs as
+they were before it was paid. If that hash still matches, the stored payslip is
+kept; if not, the old payslip is reversed (leave credits given back) and replaced.
+
+    python payroll_run.py --month May --year 2025 [--include-processed] [--dry-run]
+"""
+import argparse
+import calendar
+import time
+from collections import defaultdict
+
+from fastapi import HTTPException
+
+from db_pool import pool
+from db_utils import insert_rows, update_by_key
+from payroll_engine import EMPTY_ATTENDANCE, compute_batch, count_working_days, input_hash
+from payroll_totals import apply_payslips
+import work_calendar
+
+PAYSLIP_COLUMNS = (
+    "user_id", "dtr_id", "month", "year",
+    "working_days", "days_present", "days_absent", "leave_used",
+    "total_hours", "gross_income", "bonuses",
+    "philhealth_deduction", "tax_deduction", "loan_deduction",
+    "total_deductions", "net_income", "input_hash", "leave_credits_before"
+)
+
+# {dtr_ids} and {user_ids} are filled with one placeholder per value; explain_audit runs these too
+PERIOD_DTRS = "SELECT * FROM dtrs WHERE year = %s AND month_num = %s"
+PERIOD_ATTENDANCE = "SELECT * FROM dtr_attendance WHERE dtr_id IN ({dtr_ids})"
+PERIOD_PROFILES = """
+    SELECT user_id, base_salary_hour, employment_type, leave_credits,
+           gsis_deduction, philhealth_deduction, tax_deduction,
+           base_monthly_salary
+    FROM employee_profiles WHERE user_id IN ({user_ids})
+"""
+PERIOD_LOANS = """
+    SELECT s.loan_id, s.user_id, l.loan_name, s.payment, s.balance_after
+    FROM loan_schedule s
+    JOIN employee_loans l ON l.id = s.loan_id
+    WHERE s.user_id IN ({user_ids}) AND s.year = %s AND s.month_num = %s
+"""
+PERIOD_BONUSES = """
+    SELECT user_id, amount, frequency, bonus_type, bonus_name
+    FROM employee_bonuses WHERE user_id IN ({user_ids})
+"""
+PREVIOUS_PAYSLIPS = """
+    SELECT * FROM payslips WHERE id IN (
+        SELECT MAX(id) FROM payslips
+        WHERE user_id IN ({user_ids}) AND year = %s AND month_num = %s
+        GROUP BY user_id
+    )
+"""
+NEW_PAYSLIP_IDS = "SELECT dtr_id, MAX(id) AS id FROM payslips WHERE dtr_id IN ({dtr_ids}) GROUP BY dtr_id"
+# /compute_salary: the year of the employee's DTR for a month, on the (user_id, year, month_num) key
+DTR_FOR_MONTH = "SELECT year FROM dtrs WHERE user_id = %s AND month_num = %s ORDER BY year DESC LIMIT 1"
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _group_by(rows, key):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[key]].append(row)
+    return grouped
+
+
+def load_period(cursor, month, year, include_processed=False, user_id=None):
+    """
+    Load everything the run needs for the period, optionally for one employee.
+    Returns (dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user);
+    loans_by_user holds each employee's loan_schedule rows for the period.
+    """
+    month_num = work_calendar.month_number(month)
+    sql = PERIOD_DTRS
+    params = [year, month_num]
+    if not include_processed:
+        sql += " AND (status IS NULL OR status <> 'processed')"
+    if user_id is not None:
+        sql += " AND user_id = %s"
+        params.append(user_id)
+    # FOR UPDATE makes a concurrent run of the same period wait until we are done
+    cursor.execute(sql + " ORDER BY id DESC FOR UPDATE", params)
+
+    # One DTR per employee; the newest wins if older rows predate the unique key
+    dtrs, seen = [], set()
+    for dtr in cursor.fetchall():
+        if dtr["user_id"] not in seen:
+            seen.add(dtr["user_id"])
+            dtrs.append(dtr)
+    if not dtrs:
+        return [], {}, {}, {}, {}
+
+    dtr_ids = [d["id"] for d in dtrs]
+    user_ids = [d["user_id"] for d in dtrs]
+
+    cursor.execute(PERIOD_ATTENDANCE.format(dtr_ids=_placeholders(dtr_ids)), dtr_ids)
+    attendance_by_dtr = {row["dtr_id"]: row for row in cursor.fetchall()}
+
+    cursor.execute(PERIOD_PROFILES.format(user_ids=_placeholders(user_ids)), user_ids)
+    profiles_by_user = {p["user_id"]: p for p in cursor.fetchall()}
+
+    cursor.execute(PERIOD_LOANS.format(user_ids=_placeholders(user_ids)), user_ids + [int(year), month_num])
+    loans_by_user = _group_by(cursor.fetchall(), "user_id")
+
+    cursor.execute(PERIOD_BONUSES.format(user_ids=_placeholders(user_ids)), user_ids)
+    bonuses_by_user = _group_by(cursor.fetchall(), "user_id")
+
+    return dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user
+
+
+def load_previous(cursor, month, year, user_ids):
+    """The latest stored payslip of the period per employee. Returns {user_id: payslip}."""
+    if not user_ids:
+        return {}
+    cursor.execute(
+        PREVIOUS_PAYSLIPS.format(user_ids=_placeholders(user_ids)),
+        list(user_ids) + [year, work_calendar.month_number(month)]
+    )
+    return {row["user_id"]: row for row in cursor.fetchall()}
+
+
+def restore_inputs(previous_by_user, profiles_by_user):
+    """
+    Set profiles' leave credits, in place, to what they were when the period's previous
+    payslip was computed: its leave_credits_before. Adding the leave it used back to
+    today's credits is only right until a later month is paid, so that is just the
+    fallback for payslips stored before the snapshot.
+    Returns {user_id: today's credits with the previous payslip's leave given back},
+    the balance a replacement payslip takes its own leave from. Loans need nothing:
+    payroll never changes loan_schedule.
+    """
+    given_back = {}
+    for user_id, previous in previous_by_user.items():
+        profile = profiles_by_user.get(user_id)
+        if profile is None:
+            continue
+        given_back[user_id] = float(profile["leave_credits"] or 0) + float(previous["leave_used"] or 0)
+        before = previous.get("leave_credits_before")
+        profile["leave_credits"] = float(before) if before is not None else given_back[user_id]
+    return given_back
+
+
+def pay_period(cursor, month, year, include_processed=False, user_id=None, dry_run=False):
+    """
+    Load, compute and (unless dry_run) write one period. Does not commit.
+    Returns (payslips, unchanged, skipped): newly computed payslips, the stored
+    payslips whose inputs have not changed, and employees that could not be paid.
+    """
+    dtrs, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user = load_period(
+        cursor, month, year, include_processed, user_id
+    )
+    previous_by_user = load_previous(cursor, month, year, [d["user_id"] for d in dtrs])
+    # Today's balance, before restore_inputs rewinds the profiles
+    current_leave = {uid: float(p["leave_credits"] or 0) for uid, p in profiles_by_user.items()}
+    given_back = restore_inputs(previous_by_user, profiles_by_user)
+
+    working_days = count_working_days(year, month)
+    hashes, unchanged, to_compute = {}, [], []
+    for dtr in dtrs:
+        uid = dtr["user_id"]
+        if uid in profiles_by_user:
+            hashes[dtr["id"]] = input_hash(
+                dtr, attendance_by_dtr.get(dtr["id"], EMPTY_ATTENDANCE), profiles_by_user[uid],
+                loans_by_user.get(uid, []), bonuses_by_user.get(uid, []), working_days
+            )
+        previous = previous_by_user.get(uid)
+        if previous and previous["input_hash"] and previous["input_hash"] == hashes.get(dtr["id"]):
+            unchanged.append(dict(previous, employee_name=dtr["employee_name"]))
+        else:
+            to_compute.append(dtr)
+
+    payslips, skipped = compute_batch(
+        to_compute, attendance_by_dtr, profiles_by_user, loans_by_user, bonuses_by_user
+    )
+    for p in payslips:
+        p["input_hash"] = hashes[p["dtr_id"]]
+        p["leave_credits_before"] = profiles_by_user[p["user_id"]]["leave_credits"]
+        if p["new_leave_credits"] is not None:
+            # Taken from today's balance, not the snapshot, so later months' leave stays used
+            balance = given_back.get(p["user_id"], current_leave[p["user_id"]])
+            p["new_leave_credits"] = balance - p["leave_used"]
+
+    if not dry_run and payslips:
+        # Reverse the payslips being replaced before writing the new ones
+        replaced = [previous_by_user[p["user_id"]] for p in payslips if p["user_id"] in previous_by_user]
+        if replaced:
+            ids = [r["id"] for r in replaced]
+            cursor.execute(f"DELETE FROM payslips WHERE id IN ({_placeholders(ids)})", ids)
+            # Give the replaced payslips' leave back; write_period then takes the new payslips' leave
+            leave = {r["user_id"]: given_back[r["user_id"]] for r in replaced if float(r["leave_used"] or 0)}
+            if leave:
+                update_by_key(cursor, "employee_profiles", "user_id", "leave_credits", leave)
+        write_period(cursor, payslips)
+        apply_payslips(cursor, added=payslips, removed=replaced)
+
+    if not dry_run and unchanged:
+        # A re-uploaded DTR with the same content is back to pending; it is paid
+        ids = [p["dtr_id"] for p in unchanged]
+        cursor.execute(
+            f"UPDATE dtrs SET status = 'processed', processed_at = NOW() WHERE id IN ({_placeholders(ids)}) "
+            "AND status <> 'processed'",
+            ids
+        )
+
+    return payslips, unchanged, skipped
+
+
+def write_period(cursor, payslips):
+    """Write payslips, their bonus/loan lines and the leave and DTR updates."""
+    if not payslips:
+        return
+
+    insert_rows(cursor, "payslips", PAYSLIP_COLUMNS, [tuple(p[c] for c in PAYSLIP_COLUMNS) for p in payslips])
+
+    # Look the new ids up by DTR; auto-increment values of one multi-row
+    # INSERT are not guaranteed to be consecutive
+    dtr_ids = [p["dtr_id"] for p in payslips]
+    cursor.execute(NEW_PAYSLIP_IDS.format(dtr_ids=_placeholders(dtr_ids)), dtr_ids)
+    payslip_ids = {row["dtr_id"]: row["id"] for row in cursor.fetchall()}
+
+    loan_rows, bonus_rows = [], []
+    leave_credits = {}
+    for p in payslips:
+        payslip_id = payslip_ids[p["dtr_id"]]
+        for loan in p["loan_items"]:
+            loan_rows.append((payslip_id, loan["loan_id"], loan["loan_name"], loan["amount"], loan["new_balance"]))
+        for bonus in p["bonus_items"]:
+            bonus_rows.append((payslip_id, bonus["bonus_name"], bonus["amount"]))
+        if p["new_leave_credits"] is not None:
+            leave_credits[p["user_id"]] = p["new_leave_credits"]
+
+    if loan_rows:
+        insert_rows(
+            cursor, "payslip_loan_deductions", ("payslip_id", "loan_id", "loan_name", "amount", "balance_after"), loan_rows
+        )
+    if bonus_rows:
+        insert_rows(cursor, "payslip_bonuses", ("payslip_id", "bonus_name", "amount"), bonus_rows)
+    if leave_credits:
+        update_by_key(cursor, "employee_profiles", "user_id", "leave_credits", leave_credits)
+
+    cursor.execute(
+        f"UPDATE dtrs SET status = 'processed', processed_at = NOW() WHERE id IN ({_placeholders(dtr_ids)})",
+        dtr_ids
+    )
+
+
+def pay_employee(connection, username, month):
+    """
+    Pay one employee's DTR for the month (the /compute_salary flow).
+    Returns (payslip, recomputed); recomputed is False when the stored payslip was
+    still current. Raises HTTPException for unknown users, DTRs and profiles.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        connection.start_transaction()
+        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+        user = cursor.fetchone()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        try:
+            month_num = work_calendar.month_number(month)
+        except ValueError:
+            raise HTTPException(status_code=404, detail=f"No DTR found for {month}")
+        cursor.execute(DTR_FOR_MONTH, (user["id"], month_num))
+        dtr = cursor.fetchone()
+        if not dtr:
+            raise HTTPException(status_code=404, detail=f"No DTR found for {month}")
+
+        payslips, unchanged, skipped = pay_period(
+            cursor, month, dtr["year"], include_processed=True, user_id=user["id"]
+        )
+        if skipped:
+            detail = skipped[0]["detail"]
+            raise HTTPException(status_code=404 if detail == "Payroll profile not found" else 500, detail=detail)
+        connection.commit()
+        return (unchanged[0], False) if unchanged else (payslips[0], True)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_payroll(month, year, include_processed=False, dry_run=False):
+    """
+    Compute and store payslips for everyone with a DTR in month/year.
+    DTRs already marked processed are skipped unless include_processed is set;
+    with it, only payslips whose inputs changed are recomputed.
+    """
+    month = month.strip().capitalize()
+    if month not in calendar.month_name[1:]:
+        raise ValueError(f"Invalid month: {month}")
+    started = time.perf_counter()
+
+    with pool.connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            connection.start_transaction()
+            work_calendar.load_holidays(cursor)
+            payslips, unchanged, skipped = pay_period(cursor, month, year, include_processed, dry_run=dry_run)
+            if dry_run:
+                connection.rollback()
+            else:
+                connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    finished = time.perf_counter()
+    return {
+        "period": f"{month} {year}",
+        "dry_run": dry_run,
+        "processed": len(payslips),
+        "unchanged": len(unchanged),
+        "skipped": skipped,
+        "totals": {
+            "gross_income": round(sum(p["gross_income"] for p in payslips), 2),
+            "bonuses": round(sum(p["bonuses"] for p in payslips), 2),
+            "total_deductions": round(sum(p["total_deductions"] for p in payslips), 2),
+            "net_income": round(sum(p["net_income"] for p in payslips), 2)
+        },
+        "payslips": [
+            {
+                "user_id": p["user_id"],
+                "employee": p["employee_name"],
+                "grossIncome": p["gross_income"],
+                "totalDeductions": p["total_deductions"],
+                "netPay": p["net_income"]
+            }
+            for p in payslips
+        ],
+        "elapsed_ms": round((finished - started) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--month", required=True, help="Month name, e.g. May")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--include-processed", action="store_true",
+                        help="Also pay DTRs that already have a payslip")
+    parser.add_argument("--dry-run", action="store_true", help="Compute everything, write nothing")
+    args = parser.parse_args()
+
+    try:
+        result = run_payroll(args.month, args.year, args.include_processed, args.dry_run)
+    finally:
+        pool.close_all()
+
+    print(f"{result['period']}: {result['processed']} payslips, {result['unchanged']} unchanged, "
+          f"{len(result['skipped'])} skipped"
+          f"{' (dry run)' if result['dry_run'] else ''}")
+    for item in result["skipped"]:
+        print(f"  skipped user {item['user_id']} (dtr {item['dtr_id']}): {item['detail']}")
+    print(f"  net total: {result['totals']['net_income']:,.2f}")
+    print(f"  took {result['elapsed_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
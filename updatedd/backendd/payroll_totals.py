@@ -0,0 +1,100 @@
+"""
+Running payroll totals per employee and for the whole office, by month, quarter
+and year.
+
+payroll_totals has one row per (user_id, year, period_type, period): user_id 0 is
+the office, period is the month (1-12), the quarter (1-4) or 0 for the year.
+payroll_run keeps it current in the same transaction as the payslips: a payslip
+written is added to its six rows, a payslip replaced is taken out. Reports read a
+few rows instead of adding up payslips, however long the history is.
+"""
+import calendar
+from collections import defaultdict
+
+from db_utils import insert_rows
+import work_calendar
+
+OFFICE = 0
+TOTAL_FIELDS = ("gross_income", "bonuses", "total_deductions", "net_income")
+COLUMNS = ("user_id", "year", "period_type", "period", "payslips") + TOTAL_FIELDS
+ADD_TO_EXISTING = "ON DUPLICATE KEY UPDATE " + ", ".join(
+    f"{column} = {column} + VALUES({column})" for column in COLUMNS[4:]
+)
+PAYSLIP_COLUMNS = ("user_id", "month", "year") + TOTAL_FIELDS
+
+# Report read, on the primary key; explain_audit runs it too
+YEAR_TOTALS = "SELECT * FROM payroll_totals WHERE user_id = %s AND year = %s"
+
+
+def period_keys(payslip):
+    """The (user_id, year, period_type, period) rows a payslip counts towards."""
+    month = work_calendar.month_number(payslip["month"])
+    year = int(payslip["year"])
+    periods = (("month", month), ("quarter", work_calendar.quarter(month)), ("year", 0))
+    return [
+        (user_id, year, period_type, period)
+        for user_id in (payslip["user_id"], OFFICE)
+        for period_type, period in periods
+    ]
+
+
+def apply_payslips(cursor, added=(), removed=()):
+    """Add payslips to their totals and take removed ones out. Returns the rows touched."""
+    deltas = defaultdict(lambda: [0] + [0.0] * len(TOTAL_FIELDS))
+    for payslips, sign in ((added, 1), (removed, -1)):
+        for payslip in payslips:
+            try:
+                keys = period_keys(payslip)
+            except ValueError as e:
+                print(f"Not counting payslip {payslip.get('id')} in payroll totals: {e}")
+                continue
+            values = [sign] + [sign * float(payslip[field] or 0) for field in TOTAL_FIELDS]
+            for key in keys:
+                deltas[key] = [total + value for total, value in zip(deltas[key], values)]
+
+    rows = [
+        key + (values[0],) + tuple(round(value, 2) for value in values[1:])
+        for key, values in deltas.items()
+    ]
+    if not rows:
+        return 0
+    insert_rows(cursor, "payroll_totals", COLUMNS, rows, ADD_TO_EXISTING)
+    return len(rows)
+
+
+def backfill_totals(cursor):
+    """Rebuild payroll_totals from the latest payslip of every employee and period."""
+    cursor.execute("DELETE FROM payroll_totals")
+    cursor.execute(f"""
+        SELECT {', '.join(PAYSLIP_COLUMNS)} FROM payslips
+        WHERE id IN (SELECT MAX(id) FROM payslips GROUP BY user_id, year, month)
+    """)
+    payslips = [row if isinstance(row, dict) else dict(zip(PAYSLIP_COLUMNS, row)) for row in cursor.fetchall()]
+    return apply_payslips(cursor, payslips)
+
+
+def _totals(row):
+    return {
+        "payslips": int(row["payslips"]),
+        **{field: float(row[field]) for field in TOTAL_FIELDS}
+    }
+
+
+def year_totals(connection, user_id, year):
+    """Month, quarter and year totals of one employee (or OFFICE) for a year."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(YEAR_TOTALS, (user_id, year))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    result = {"months": {}, "quarters": {}, "year": None}
+    for row in sorted(rows, key=lambda r: r["period"]):
+        if row["period_type"] == "month":
+            result["months"][calendar.month_name[row["period"]]] = _totals(row)
+        elif row["period_type"] == "quarter":
+            result["quarters"][f"Q{row['period']}"] = _totals(row)
+        else:
+            result["year"] = _totals(row)
+    return result
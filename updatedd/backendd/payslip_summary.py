@@ -0,0 +1,176 @@
+"""
+Payslip summaries over a selection of months (the /api/payslip/summary report).
+
+load_summary_rows fetches the selected payslips and their bonus and loan lines in
+three queries however many months are selected; build_summary does the monthly and
+breakdown totals in memory.
+"""
+from collections import defaultdict
+
+import work_calendar
+
+QUARTER_LABELS = {1: "Jan-Mar", 2: "Apr-Jun", 3: "Jul-Sep", 4: "Oct-Dec"}
+
+# {years}, {months} and {ids} are filled with one placeholder per value; explain_audit runs these too.
+# No ORDER BY: the latest payslip of each period is picked here, which saves MySQL a filesort.
+SUMMARY_PAYSLIPS = """
+    SELECT * FROM payslips
+    WHERE user_id = %s AND year IN ({years}) AND month_num IN ({months})
+"""
+SUMMARY_BONUSES = "SELECT payslip_id, bonus_name, amount FROM payslip_bonuses WHERE payslip_id IN ({ids})"
+# Balances are as of each payslip, stored when it was computed
+SUMMARY_LOAN_LINES = """
+    SELECT payslip_id, loan_name, amount, balance_after AS balance
+    FROM payslip_loan_deductions WHERE payslip_id IN ({ids})
+"""
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def period_key(month, year):
+    """(year, month_num) for a selected month; raises ValueError for an unknown month."""
+    return int(year), work_calendar.month_number(month)
+
+
+def _period_keys(periods):
+    keys = set()
+    for month, year in periods:
+        try:
+            keys.add(period_key(month, year))
+        except ValueError:
+            continue
+    return keys
+
+
+def _newer(payslip, other):
+    # Same order as /payslip's ORDER BY created_at DESC, ties to the higher id
+    return (payslip["created_at"], payslip["id"]) > (other["created_at"], other["id"])
+
+
+def load_summary_rows(connection, user_id, periods):
+    """
+    The latest payslip of each selected (month, year) with its bonus and loan lines.
+    Returns (payslips_by_period, bonuses_by_payslip, loans_by_payslip), keyed by
+    period_key and payslip id.
+    """
+    bonuses_by_payslip, loans_by_payslip = defaultdict(list), defaultdict(list)
+    wanted = _period_keys(periods)
+    if not wanted:
+        return {}, bonuses_by_payslip, loans_by_payslip
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        years = sorted({year for year, _ in wanted})
+        months = sorted({month for _, month in wanted})
+        cursor.execute(
+            SUMMARY_PAYSLIPS.format(years=_placeholders(years), months=_placeholders(months)),
+            [user_id] + years + months
+        )
+
+        # The year and month lists also match combinations nobody selected
+        payslips_by_period = {}
+        for payslip in cursor.fetchall():
+            key = (payslip["year"], payslip["month_num"])
+            latest = payslips_by_period.get(key)
+            if key in wanted and (latest is None or _newer(payslip, latest)):
+                payslips_by_period[key] = payslip
+        if not payslips_by_period:
+            return payslips_by_period, bonuses_by_payslip, loans_by_payslip
+
+        ids = [payslip["id"] for payslip in payslips_by_period.values()]
+        cursor.execute(SUMMARY_BONUSES.format(ids=_placeholders(ids)), ids)
+        for bonus in cursor.fetchall():
+            bonuses_by_payslip[bonus["payslip_id"]].append(bonus)
+
+        cursor.execute(SUMMARY_LOAN_LINES.format(ids=_placeholders(ids)), ids)
+        for loan in cursor.fetchall():
+            loans_by_payslip[loan["payslip_id"]].append(loan)
+    finally:
+        cursor.close()
+
+    return payslips_by_period, bonuses_by_payslip, loans_by_payslip
+
+
+def quarter_label(month, year):
+    try:
+        return f"{QUARTER_LABELS[work_calendar.quarter(month)]} {year}"
+    except ValueError:
+        return f"Q{month} {year}"
+
+
+def build_summary(periods, payslips_by_period, bonuses_by_payslip, loans_by_payslip):
+    """
+    Monthly, quarterly and total figures plus income and deduction breakdowns for the
+    selected periods, in selection order. Periods without a payslip are left out.
+    quarterSummary adds up the selected months only, like monthlySummary and totals.
+    """
+    monthly_summary = {}
+    income_breakdown = defaultdict(lambda: defaultdict(float))
+    deduction_breakdown = defaultdict(lambda: defaultdict(float))
+    selected_totals = defaultdict(float)
+    month_list = []
+
+    for month, year in periods:
+        try:
+            payslip = payslips_by_period.get(period_key(month, year))
+        except ValueError:
+            continue
+        if not payslip:
+            continue
+
+        payslip_id = payslip["id"]
+        month_key = f"{month} {year}"
+        month_list.append(month_key)
+        quarter_key = quarter_label(month, year)
+
+        gross = float(payslip.get("gross_income", 0))
+        deductions = float(payslip.get("total_deductions", 0))
+        net = float(payslip.get("net_income", 0))
+
+        monthly_summary[month_key] = {
+            "gross_income": gross,
+            "total_deductions": deductions,
+            "net_income": net,
+            "quarter": quarter_key
+        }
+
+        selected_totals[f"{quarter_key}_gross"] += gross
+        selected_totals[f"{quarter_key}_deductions"] += deductions
+        selected_totals[f"{quarter_key}_net"] += net
+
+        income_breakdown["Base Salary"][month_key] += gross
+        for bonus in bonuses_by_payslip.get(payslip_id, []):
+            income_breakdown[bonus["bonus_name"]][month_key] += float(bonus["amount"])
+
+        for loan in loans_by_payslip.get(payslip_id, []):
+            deduction_breakdown[loan["loan_name"]][month_key] += float(loan["amount"])
+            deduction_breakdown[f"{loan['loan_name']}_balance"][month_key] = float(loan["balance"]) if loan["balance"] is not None else 0.0
+
+        # Gov deductions
+        gsis = float(payslip.get("total_deductions", 0)) - float(payslip.get("loan_deduction", 0)) - float(payslip.get("tax_deduction", 0)) - float(payslip.get("philhealth_deduction", 0))
+        deduction_breakdown["GSIS"][month_key] += gsis
+        deduction_breakdown["PhilHealth"][month_key] += float(payslip.get("philhealth_deduction", 0))
+        deduction_breakdown["Tax"][month_key] += float(payslip.get("tax_deduction", 0))
+
+    quarter_summary = {}
+    for quarter in set(m["quarter"] for m in monthly_summary.values()):
+        quarter_summary[quarter] = {
+            "gross_income": selected_totals[f"{quarter}_gross"],
+            "total_deductions": selected_totals[f"{quarter}_deductions"],
+            "net_income": selected_totals[f"{quarter}_net"]
+        }
+
+    return {
+        "monthlySummary": monthly_summary,
+        "quarterSummary": quarter_summary,
+        "incomeBreakdown": dict(income_breakdown),
+        "deductionBreakdown": dict(deduction_breakdown),
+        "totals": {
+            "gross_income": sum(m["gross_income"] for m in monthly_summary.values()),
+            "total_deductions": sum(m["total_deductions"] for m in monthly_summary.values()),
+            "net_income": sum(m["net_income"] for m in monthly_summary.values())
+        },
+        "months": month_list
+    }
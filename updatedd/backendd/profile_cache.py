@@ -0,0 +1,244 @@
+"""
+Read cache for GET /api/user/profile, keyed by username.
+
+Entries expire after PROFILE_CACHE_TTL seconds and are dropped by the writes that
+change a profile: update_user_profile, register_user, compute_salary (leave credits)
+and payroll runs (everyone). Configure per deployment:
+  PROFILE_CACHE            "memory" (in-process LRU, the default), "sqlite" or "off"
+  PROFILE_CACHE_TTL        seconds an entry may be served, default 60
+  PROFILE_CACHE_MAX_BYTES  bound on the cached JSON, least recently used entries go first
+  PROFILE_CACHE_PATH       SQLite file for the "sqlite" backend
+With several uvicorn workers use "sqlite": each worker has its own memory cache, so
+an invalidation in one worker would only reach the others through the TTL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ocr_cache import cached_bytes, track_bytes
+
+PROFILE_CACHE = os.getenv("PROFILE_CACHE", "memory")
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", 60))
+PROFILE_CACHE_MAX_BYTES = int(os.getenv("PROFILE_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+PROFILE_CACHE_PATH = os.getenv(
+    "PROFILE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_cache.sqlite3")
+)
+
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+class MemoryBackend:
+    """LRU over an OrderedDict of key -> (expires, value, size), oldest use first."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, now):
+        """Returns (value, expired); value is None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry[0] <= now:
+                self._remove(key)
+                return None, True
+            self._entries.move_to_end(key)
+            return entry[1], False
+
+    def put(self, key, value, expires):
+        """Returns the number of entries evicted to stay under max_bytes."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return 0
+            self._entries[key] = (expires, value, size)
+            self._bytes += size
+            evicted = 0
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteBackend:
+    """The same LRU in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread and per process, as in ocr_cache
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS profile_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_cache_last_used ON profile_cache (last_used)")
+            track_bytes(conn, "profile_cache")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, now):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM profile_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, False
+        if row[1] <= now:
+            conn.execute("DELETE FROM profile_cache WHERE key = ?", (key,))
+            return None, True
+        conn.execute("UPDATE profile_cache SET last_used = ? WHERE key = ?", (now, key))
+        return row[0], False
+
+    def put(self, key, value, expires):
+        size = len(value.encode("utf-8"))
+        conn = self._conn()
+        if size > self.max_bytes:
+            conn.execute("DELETE FROM profile_cache WHERE key = ?", (key,))
+            return 0
+        conn.execute("""
+            INSERT INTO profile_cache (key, value, size, expires, last_used) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value, size = excluded.size, expires = excluded.expires, last_used = excluded.last_used
+        """, (key, value, size, expires, time.time()))
+        total = cached_bytes(conn, "profile_cache")
+        if total <= self.max_bytes:
+            return 0
+        doomed = []
+        for old_key, old_size in conn.execute("SELECT key, size FROM profile_cache ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((old_key,))
+            total -= old_size
+        conn.executemany("DELETE FROM profile_cache WHERE key = ?", doomed)
+        return len(doomed)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM profile_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM profile_cache")
+
+    def usage(self):
+        conn = self._conn()
+        return conn.execute("SELECT COUNT(*) FROM profile_cache").fetchone()[0], cached_bytes(conn, "profile_cache")
+
+
+BACKENDS = {
+    "memory": lambda: MemoryBackend(PROFILE_CACHE_MAX_BYTES),
+    "sqlite": lambda: SQLiteBackend(PROFILE_CACHE_PATH, PROFILE_CACHE_MAX_BYTES),
+    "off": lambda: None,
+}
+
+if PROFILE_CACHE not in BACKENDS:
+    raise ValueError(f"Unknown PROFILE_CACHE backend '{PROFILE_CACHE}', expected one of {sorted(BACKENDS)}")
+
+_backend = BACKENDS[PROFILE_CACHE]()
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def get(username):
+    """The cached profile response for username, or None."""
+    if _backend is None:
+        return None
+    try:
+        value, expired = _backend.get(username, time.time())
+    except sqlite3.Error as e:
+        print(f"⚠️ Profile cache read failed: {e}")
+        return None
+    if expired:
+        _count("expired")
+    _count("hits" if value is not None else "misses")
+    return json.loads(value) if value is not None else None
+
+
+def put(username, profile):
+    """Cache a JSON-ready profile response (see fastapi.encoders.jsonable_encoder)."""
+    if _backend is None:
+        return
+    try:
+        evicted = _backend.put(username, json.dumps(profile), time.time() + PROFILE_CACHE_TTL)
+    except sqlite3.Error as e:
+        print(f"⚠️ Profile cache write failed: {e}")
+        return
+    if evicted:
+        _count("evictions", evicted)
+
+
+def invalidate(username):
+    if _backend is None:
+        return
+    try:
+        _backend.delete(username)
+    except sqlite3.Error as e:
+        print(f"⚠️ Profile cache invalidation failed: {e}")
+        return
+    _count("invalidations")
+
+
+def clear():
+    if _backend is None:
+        return
+    try:
+        _backend.clear()
+    except sqlite3.Error as e:
+        print(f"⚠️ Profile cache clear failed: {e}")
+        return
+    _count("invalidations")
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    result["backend"] = PROFILE_CACHE
+    result["ttl_seconds"] = PROFILE_CACHE_TTL
+    result["max_bytes"] = PROFILE_CACHE_MAX_BYTES
+    if _backend is not None:
+        try:
+            result["entries"], result["bytes"] = _backend.usage()
+        except sqlite3.Error:
+            pass
+    return result
@@ -0,0 +1,124 @@
+"""
+Saving the bonus and loan lists of PUT /api/user/profile.
+
+The submitted lists are diffed against the stored rows. Items are matched by id, or
+by type and name when the client sent none, and only what changed is written: one
+multi-row INSERT for new items, one INSERT ... ON DUPLICATE KEY UPDATE for changed
+ones and one DELETE for removed ones. Unchanged loans keep their id, balance and
+amortization schedule.
+"""
+from db_utils import insert_rows
+from loan_schedule import LOAN_COLUMNS, save_schedules
+
+BONUS_FIELDS = ("bonus_type", "bonus_name", "amount", "frequency")
+LOAN_FIELDS = ("loan_type", "loan_name", "amount", "start_month", "start_year", "duration_months")
+# A loan with new terms gets a new schedule and starts again from the full amount
+LOAN_TERMS = ("amount", "start_month", "start_year", "duration_months")
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _comparable(row, fields):
+    # Stored DECIMAL/INT values against submitted floats and strings
+    return tuple(
+        round(float(row[field] or 0), 2) if field == "amount" else ("" if row[field] is None else str(row[field]))
+        for field in fields
+    )
+
+
+def _rows(cursor, columns):
+    return [row if isinstance(row, dict) else dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _item_id(item):
+    try:
+        return int(item["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def diff_rows(stored, submitted, fields):
+    """
+    Match submitted items to stored rows. fields[:2] are the type and name used when
+    an item has no id. Returns (inserts, updates, deletes): new items, (stored row,
+    item) pairs whose fields differ, and the ids of stored rows nobody submitted.
+    """
+    unmatched = {row["id"]: row for row in stored}
+    inserts, updates, without_id = [], [], []
+
+    def match(row, item):
+        del unmatched[row["id"]]
+        if _comparable(row, fields) != _comparable(item, fields):
+            updates.append((row, item))
+
+    for item in submitted:
+        row = unmatched.get(_item_id(item))
+        if row is None:
+            without_id.append(item)
+        else:
+            match(row, item)
+
+    for item in without_id:
+        key = _comparable(item, fields[:2])
+        row = next((r for r in unmatched.values() if _comparable(r, fields[:2]) == key), None)
+        if row is None:
+            inserts.append(item)
+        else:
+            match(row, item)
+
+    return inserts, updates, list(unmatched)
+
+
+def _write(cursor, table, user_id, columns, inserts, updates, deletes):
+    if inserts:
+        insert_rows(cursor, table, ("user_id",) + columns, [
+            (user_id,) + tuple(item[column] for column in columns) for item in inserts
+        ])
+    if updates:
+        insert_rows(cursor, table, ("id", "user_id") + columns, [
+            (row_id, user_id) + tuple(item[column] for column in columns) for row_id, item in updates
+        ], "ON DUPLICATE KEY UPDATE " + ", ".join(f"{column} = VALUES({column})" for column in columns))
+    if deletes:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({_placeholders(deletes)})", deletes)
+
+
+def sync_bonuses(cursor, user_id, bonuses):
+    """Make the user's employee_bonuses match the submitted items. Returns (inserted, updated, deleted)."""
+    cursor.execute(f"SELECT id, {', '.join(BONUS_FIELDS)} FROM employee_bonuses WHERE user_id = %s", (user_id,))
+    stored = _rows(cursor, ("id",) + BONUS_FIELDS)
+    inserts, updates, deletes = diff_rows(stored, bonuses, BONUS_FIELDS)
+    _write(cursor, "employee_bonuses", user_id, BONUS_FIELDS, inserts,
+           [(row["id"], item) for row, item in updates], deletes)
+    return len(inserts), len(updates), len(deletes)
+
+
+def sync_loans(cursor, user_id, loans):
+    """
+    Make the user's employee_loans match the submitted items and regenerate the
+    schedules of new and changed loans. Returns (inserted, updated, deleted).
+    """
+    cursor.execute(
+        f"SELECT id, {', '.join(LOAN_FIELDS)}, balance FROM employee_loans WHERE user_id = %s", (user_id,)
+    )
+    stored = _rows(cursor, ("id",) + LOAN_FIELDS + ("balance",))
+    inserts, updates, deletes = diff_rows(stored, loans, LOAN_FIELDS)
+
+    columns = LOAN_FIELDS + ("balance",)
+    new_terms = {row["id"] for row, item in updates if _comparable(row, LOAN_TERMS) != _comparable(item, LOAN_TERMS)}
+    _write(cursor, "employee_loans", user_id, columns,
+           [dict(item, balance=item["amount"]) for item in inserts],
+           [
+               (row["id"], dict(item, balance=item["amount"] if row["id"] in new_terms else row["balance"]))
+               for row, item in updates
+           ],
+           deletes)
+
+    if inserts or new_terms:
+        # Deleted loans take their schedules with them (ON DELETE CASCADE)
+        cursor.execute(f"SELECT {', '.join(LOAN_COLUMNS)} FROM employee_loans WHERE user_id = %s", (user_id,))
+        known = {row["id"] for row in stored}
+        changed = [row for row in _rows(cursor, LOAN_COLUMNS) if row["id"] not in known or row["id"] in new_terms]
+        save_schedules(cursor, changed)
+    return len(inserts), len(updates), len(deletes)
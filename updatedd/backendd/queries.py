@@ -0,0 +1,134 @@
+"""
+SQL of the per-request endpoint queries in main.py, kept here so explain_audit.py
+EXPLAINs exactly what the endpoints run. Queries owned by other modules live next to
+their code (payroll_run, payslip_summary, payroll_totals) and the audit imports
+them from there.
+"""
+
+USER_BY_USERNAME = "SELECT id, full_name FROM users WHERE username = %s"
+
+# /api/user/profile
+PROFILE_USER = """
+    SELECT id, full_name, username, email
+    FROM users
+    WHERE username = %s
+    LIMIT 1
+"""
+
+PROFILE_PAYROLL = """
+    SELECT
+        IFNULL(employment_type, 'regular') AS employment_type,
+        IFNULL(salary_grade, '12') AS salaryGrade,
+        IFNULL(base_monthly_salary, 0) AS baseMonthlySalary,
+        IFNULL(base_salary_hour, 0) AS baseSalaryPerHour,
+        IFNULL(gsis_deduction, 0) AS gsisDeduction,
+        IFNULL(philhealth_deduction, 0) AS philhealthDeduction,
+        IFNULL(tax_deduction, 0) AS taxDeduction,
+        IFNULL(leave_credits, 0) AS leaveCredits
+    FROM employee_profiles
+    WHERE user_id = %s
+"""
+
+PROFILE_BONUSES = """
+    SELECT
+        id,
+        IFNULL(bonus_type, '') AS bonus_type,
+        IFNULL(bonus_name, '') AS bonus_name,
+        IFNULL(amount, 0) AS amount,
+        IFNULL(frequency, 'monthly') AS frequency,
+        DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS created_at
+    FROM employee_bonuses
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+"""
+
+# Parameters: the current period as year * 12 + month, then the user id
+PROFILE_LOANS = """
+    SELECT
+        id,
+        IFNULL(loan_type, '') AS loan_type,
+        IFNULL(loan_name, '') AS loan_name,
+        IFNULL(amount, 0) AS amount,
+        IFNULL(start_month, '') AS start_month,
+        IFNULL(start_year, '') AS start_year,
+        IFNULL(duration_months, 0) AS duration_months,
+        -- Balance after this month's installment; loans not started yet owe the full amount
+        CAST(COALESCE(
+            (SELECT s.balance_after FROM loan_schedule s
+             WHERE s.loan_id = employee_loans.id AND s.year * 12 + s.month_num <= %s
+             ORDER BY s.year DESC, s.month_num DESC LIMIT 1),
+            balance, 0) AS DECIMAL(10,2)) AS balance,
+        DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS created_at
+    FROM employee_loans
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+"""
+
+# /payslip and /payslip/latest
+PAYSLIP_FOR_PERIOD = """
+    SELECT *
+    FROM payslips
+    WHERE user_id = %s AND year = %s AND month_num = %s
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+PAYSLIP_PROFILE = """
+    SELECT employment_type, base_salary_hour, base_monthly_salary, salary_grade
+    FROM employee_profiles
+    WHERE user_id = %s
+"""
+
+LATEST_PAYSLIP = """
+    SELECT * FROM payslips
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+PAYSLIP_BONUSES = "SELECT bonus_name, amount FROM payslip_bonuses WHERE payslip_id = %s"
+
+# Balance as of the payslip, stored when it was computed
+PAYSLIP_LOAN_LINES = """
+    SELECT loan_name, amount, balance_after AS balance
+    FROM payslip_loan_deductions
+    WHERE payslip_id = %s
+"""
+
+# /available-months: grouped on the (user_id, year, month_num) index instead of a DISTINCT over TRIM(month)
+AVAILABLE_MONTHS = """
+    SELECT year, month_num, MIN(TRIM(month)) AS month
+    FROM payslips
+    WHERE user_id = %s
+    GROUP BY year, month_num
+    ORDER BY year DESC, month_num DESC
+"""
+
+# /api/payslip/summary; the payslips and their lines are payslip_summary's
+SUMMARY_USER = """
+    SELECT u.id, e.employment_type, e.base_salary_hour, e.base_monthly_salary, e.salary_grade, u.full_name
+    FROM users u
+    LEFT JOIN employee_profiles e ON u.id = e.user_id
+    WHERE u.username = %s
+"""
+
+# /api/records
+USER_RECORDS = """
+    SELECT
+        p.month,
+        p.year,
+        p.gross_income,
+        p.total_deductions,
+        p.net_income,
+        p.created_at
+    FROM payslips p
+    WHERE p.user_id = %s
+    ORDER BY p.year DESC, p.month_num DESC
+"""
+
+# ETag validator of /available-months and /api/records: changes whenever one of the
+# user's payslips is added, replaced, removed or corrected
+USER_PAYSLIPS_VERSION = """
+    SELECT COUNT(*) AS payslips, MAX(id) AS last_id, MAX(updated_at) AS updated_at
+    FROM payslips WHERE user_id = %s
+"""
@@ -0,0 +1,137 @@
+"""
+Working-day calendar for payroll.
+
+For each year a table of working days and holidays per month is built once and
+kept in memory, so payroll lookups are a dict access. Configure per deployment:
+  PAYROLL_WEEKEND   weekday numbers that are not working days (Monday=0), default "5,6"
+  PAYROLL_HOLIDAYS  built-in holiday set: "ph" (Philippine regular holidays) or "none"
+Proclaimed holidays and special non-working days go in the holidays table and are
+picked up by load_holidays.
+"""
+import calendar
+import os
+import threading
+from datetime import date, timedelta
+
+PAYROLL_WEEKEND = frozenset(int(d) for d in os.getenv("PAYROLL_WEEKEND", "5,6").split(",") if d.strip())
+PAYROLL_HOLIDAYS = os.getenv("PAYROLL_HOLIDAYS", "ph")
+
+MONTH_NUMBERS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+
+_extra_holidays = {}    # date -> name, from the holidays table
+_years = {}             # year -> {month: {"working_days": int, "holidays": [...]}}
+_lock = threading.Lock()
+
+
+def month_number(month):
+    """1-12 for "May", "may", "05" or 5. Raises ValueError for anything else."""
+    if isinstance(month, int) or str(month).strip().isdigit():
+        number = int(month)
+    else:
+        number = MONTH_NUMBERS.get(str(month).strip().lower(), 0)
+    if not 1 <= number <= 12:
+        raise ValueError(f"Invalid month: {month}")
+    return number
+
+
+def easter(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def last_weekday(year, month, weekday):
+    day = date(year, month, calendar.monthrange(year, month)[1])
+    return day - timedelta(days=(day.weekday() - weekday) % 7)
+
+
+def ph_regular_holidays(year):
+    easter_sunday = easter(year)
+    return {
+        date(year, 1, 1): "New Year's Day",
+        easter_sunday - timedelta(days=3): "Maundy Thursday",
+        easter_sunday - timedelta(days=2): "Good Friday",
+        date(year, 4, 9): "Araw ng Kagitingan",
+        date(year, 5, 1): "Labor Day",
+        date(year, 6, 12): "Independence Day",
+        last_weekday(year, 8, 0): "National Heroes Day",
+        date(year, 11, 30): "Bonifacio Day",
+        date(year, 12, 25): "Christmas Day",
+        date(year, 12, 30): "Rizal Day",
+    }
+
+
+BUILTIN_HOLIDAYS = {
+    "ph": ph_regular_holidays,
+    "none": lambda year: {},
+}
+
+if PAYROLL_HOLIDAYS not in BUILTIN_HOLIDAYS:
+    raise ValueError(f"Unknown PAYROLL_HOLIDAYS set '{PAYROLL_HOLIDAYS}', expected one of {sorted(BUILTIN_HOLIDAYS)}")
+
+
+def load_holidays(cursor):
+    """Replace the table-defined holidays with the rows of the holidays table."""
+    cursor.execute("SELECT holiday_date, name FROM holidays")
+    rows = cursor.fetchall()
+    holidays = {}
+    for row in rows:
+        holiday_date, name = (row["holiday_date"], row["name"]) if isinstance(row, dict) else row
+        holidays[holiday_date] = name
+    with _lock:
+        _extra_holidays.clear()
+        _extra_holidays.update(holidays)
+        _years.clear()
+    return len(holidays)
+
+
+def holidays(year):
+    result = dict(BUILTIN_HOLIDAYS[PAYROLL_HOLIDAYS](year))
+    result.update((day, name) for day, name in _extra_holidays.items() if day.year == year)
+    return result
+
+
+def build_year(year):
+    year_holidays = holidays(year)
+    table = {}
+    for month in range(1, 13):
+        working_days = 0
+        month_holidays = []
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            current = date(year, month, day)
+            if current.weekday() in PAYROLL_WEEKEND:
+                continue
+            if current in year_holidays:
+                month_holidays.append({"date": current.isoformat(), "name": year_holidays[current]})
+                continue
+            working_days += 1
+        table[month] = {"working_days": working_days, "holidays": month_holidays}
+    return table
+
+
+def year_table(year):
+    table = _years.get(year)
+    if table is None:
+        with _lock:
+            table = _years.get(year)
+            if table is None:
+                table = _years[year] = build_year(year)
+    return table
+
+
+def working_days(year, month):
+    """Working days in the month (name or number), weekends and holidays excluded."""
+    return year_table(int(year))[month_number(month)]["working_days"]
+
+
+def quarter(month):
+    return (month_number(month) - 1) // 3 + 1
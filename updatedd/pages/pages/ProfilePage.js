@@ -68,6 +68,7 @@ const ProfilePage = () => {
         const filteredBonuses = bonuses
           .filter(b => b.bonus_type !== 'other')
           .map(b => ({
+            id: b.id,
             type: b.bonus_type,
             name: b.bonus_name,
             amount: parseFloat(b.amount) || 0,
@@ -79,6 +80,7 @@ const ProfilePage = () => {
         .map(l => {
 
           return {
+            id: l.id,
             type: l.loan_type,
             name: l.loan_name,
             amount: parseFloat(l.amount) || 0,
@@ -106,11 +108,13 @@ const ProfilePage = () => {
           bonuses: filteredBonuses,
           loans: filteredLoans,
           bonusOther: {
+            id: bonusOtherRaw.id,
             name: bonusOtherRaw.bonus_name || '',
             amount: parseFloat(bonusOtherRaw.amount) || 0,
             frequency: bonusOtherRaw.frequency || 'monthly'
           },
           loanOther: {
+            id: loanOtherRaw.id,
             name: loanOtherRaw.loan_name || '',
             amount: parseFloat(loanOtherRaw.amount) || 0,
             startMonth: loanOtherRaw.start_month || '',
@@ -198,6 +202,7 @@ const ProfilePage = () => {
           loans: validLoans,
           bonusOther: userData.bonusOther?.name ? userData.bonusOther : null,
           loanOther: userData.loanOther?.name ? {
+            id: userData.loanOther.id,
             name: userData.loanOther.name,
             amount: userData.loanOther.amount,
             durationMonths: userData.loanOther.durationMonths,